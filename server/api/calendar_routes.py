@@ -78,6 +78,22 @@ async def get_upcoming(days: int = 7, limit: int = 10):
     return result
 
 
+@router.get("/dashboard")
+async def get_dashboard(days: int = 7, limit: int = 10):
+    """Get today's and upcoming calendar events in one request."""
+    from integrations.calendar import get_calendar_integration
+
+    calendar = get_calendar_integration()
+    if not calendar.is_authenticated:
+        raise HTTPException(status_code=401, detail="Calendar not connected")
+
+    result = await calendar.get_dashboard(days=days, max_results=limit)
+    if not result.get("success"):
+        raise HTTPException(status_code=500, detail=result.get("error"))
+
+    return result
+
+
 @router.post("/event")
 async def create_event(
     summary: str,
@@ -2,7 +2,7 @@
 
 import os
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from typing import Optional
 
 from config import get_settings
@@ -11,6 +11,7 @@ from schemas.models import (
     VoiceProcessResponse,
     ChatMessageRequest,
     ChatMessageResponse,
+    TTSStreamRequest,
     Language,
     UserProfile
 )
@@ -249,6 +250,58 @@ async def chat_message(request: ChatMessageRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatMessageRequest):
+    """
+    Process text message and stream the response text as it is generated.
+
+    No quick commands and no audio - meant for clients that render text live.
+    """
+    profile_manager = get_profile_manager()
+    memory_manager = get_memory_manager()
+
+    profile = profile_manager.get_profile(request.user_id)
+    history = memory_manager.get_recent_messages(request.user_id)
+    llm = get_llm_service()
+
+    lang = request.language.value
+    if lang == "auto":
+        cyrillic_count = sum(1 for c in request.text if '\u0400' <= c <= '\u04FF')
+        lang = "ru" if cyrillic_count > len(request.text) * 0.3 else "en"
+
+    async def generate():
+        chunks = []
+        async for chunk in llm.chat_stream(
+            user_message=request.text,
+            conversation_history=history,
+            profile=profile
+        ):
+            chunks.append(chunk)
+            yield chunk
+
+        # Save to memory once the full response is known
+        memory_manager.add_message(request.user_id, "user", request.text, Language(lang))
+        memory_manager.add_message(request.user_id, "assistant", "".join(chunks))
+
+    return StreamingResponse(generate(), media_type="text/plain; charset=utf-8")
+
+
+@router.post("/tts/stream")
+async def tts_stream(request: TTSStreamRequest):
+    """Stream synthesized speech as MP3 so playback can start before synthesis ends."""
+    tts = get_tts_service()
+
+    lang = request.language.value
+    if lang == "auto":
+        cyrillic_count = sum(1 for c in request.text if '\u0400' <= c <= '\u04FF')
+        lang = "ru" if cyrillic_count > len(request.text) * 0.3 else "en"
+
+    return StreamingResponse(
+        tts.stream(request.text, language=lang, emotion=request.emotion.value),
+        media_type="audio/mpeg"
+    )
+
+
 # ============== Audio Files ==============
 
 @router.get("/audio/{filename}")
@@ -459,6 +512,10 @@ async def store_credentials(
 
     vault.store(service, credentials)
 
+    if service == "firebase":
+        from core.notifications import get_notification_service
+        get_notification_service().reload_config()
+
     return {
         "status": "ok",
         "service": service,
@@ -534,16 +591,17 @@ async def setup_user_schedule(user_id: str):
 # ============== Smart Integrations ==============
 
 @router.get("/integrations/discover")
-async def discover_devices():
+async def discover_devices(force: bool = False):
     """
     Scan local network for smart devices.
 
     Returns list of discovered devices with integration suggestions.
+    A recent scan is reused unless force is set.
     """
     from integrations.base import discover_network_devices, suggest_integrations
 
     try:
-        devices = await discover_network_devices(timeout=5)
+        devices = await discover_network_devices(timeout=5, force=force)
         suggestions = await suggest_integrations(devices)
 
         return {
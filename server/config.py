@@ -32,14 +32,25 @@ class Settings(BaseSettings):
     # Whisper STT
     whisper_model: str = "small"
     whisper_device: str = "cpu"
-    whisper_compute_type: str = "int8"
+    whisper_compute_type: str = ""  # Empty: int8 on CPU, int8_float16 on GPU
+    # Greedy decoding is several times faster than beam search; larger beams
+    # only slightly lower the error rate on short conversational audio
+    whisper_beam_size: int = 1
+    whisper_cpu_threads: int = 0  # 0: use all CPU cores
+    whisper_num_workers: int = 1
 
     # TTS voices
     tts_voice_ru: str = "ru-RU-SvetlanaNeural"
     tts_voice_en: str = "en-US-AriaNeural"
 
+    # Semantic response cache (requires sentence-transformers)
+    semantic_cache_enabled: bool = True
+    semantic_cache_model: str = "all-MiniLM-L6-v2"
+    semantic_cache_threshold: float = 0.87
+
     # Memory
     max_conversation_history: int = 20
+    history_token_budget: int = 3000  # Estimated tokens of history sent to the LLM
     data_dir: str = "/app/data"
     log_file: str = "/app/data/eva.log"
     max_log_lines: int = 500
@@ -1,12 +1,144 @@
 """Quick command parser for EVA - handles reminders, timers, etc."""
 
 import re
+import asyncio
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional, Tuple, Dict, Any, List
 
+from rapidfuzz import fuzz, process
+
 logger = logging.getLogger("eva.commands")
 
+# Long-lived event loop for running integration coroutines from sync code
+_bg_loop: Optional[asyncio.AbstractEventLoop] = None
+_bg_loop_lock = threading.Lock()
+
+SMART_HOME_TIMEOUT = 10  # seconds
+
+# Home Assistant device list used for name lookup: (fetched_at, states)
+HA_STATES_TTL = 10  # seconds
+_ha_states_cache: Optional[Tuple[float, dict]] = None
+
+# Minimum rapidfuzz WRatio score for matching a spoken device name
+ENTITY_MATCH_CUTOFF = 75
+
+# Quick command responses, keyed by command
+_TEMPLATES = {
+    "time": "Сейчас {time}",
+    "date": "Сегодня {weekday}, {day} {month} {year} года",
+    "reminder_text": "Хорошо, напомню тебе через {n} {unit}: \"{text}\"",
+    "reminder": "Окей, напомню через {n} {unit}!",
+    "reminder_message": "Время пришло!",
+    "timer": "Таймер на {n} {unit} запущен!",
+    "timer_message": "Таймер на {n} {unit} завершён!",
+    "pomodoro": "🍅 Помидор на {n} {unit} запущен! Фокусируйся, я напомню когда закончится.",
+    "pomodoro_message": "🍅 Помидор завершён! Время для перерыва.",
+    "break": "☕ Отдыхай {n} {unit}. Я скажу когда пора возвращаться.",
+    "break_message": "☕ Перерыв окончен! Готов к новому помидору?",
+}
+
+_MINUTE_FORMS = ("минуту", "минуты", "минут")
+_HOUR_FORMS = ("час", "часа", "часов")
+
+_WEEKDAYS_RU = ['понедельник', 'вторник', 'среда', 'четверг', 'пятница', 'суббота', 'воскресенье']
+_MONTHS_RU = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+              'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря']
+
+
+# Keywords for the "<verb> ... <connector> <N> <unit>" fast path
+_REMINDER_VERBS = ("напомни", "reminder")
+_REMINDER_CONNECTORS = ("через", "in")
+_TIMER_VERBS = ("таймер", "timer")
+_TIMER_CONNECTORS = ("на", "for")
+_MINUTE_UNITS = ("минут", "мин", "minute", "min")
+_HOUR_UNITS = ("час", "hour", "hr")
+
+
+def _parse_number_after(
+    text_lower: str,
+    verbs: Tuple[str, ...],
+    connectors: Tuple[str, ...],
+    units: Tuple[str, ...]
+) -> Optional[int]:
+    """
+    Scan lowercased text for "<verb> ... <connector> <N> <unit>" and return N.
+
+    Only handles the common shape (first verb, first connector after it);
+    returns None otherwise so the caller can fall back to the full regex.
+    """
+    verb_end = -1
+    verb_idx = len(text_lower)
+    for verb in verbs:
+        idx = text_lower.find(verb)
+        if 0 <= idx < verb_idx:
+            verb_idx, verb_end = idx, idx + len(verb)
+    if verb_end < 0:
+        return None
+
+    pos = -1
+    conn_idx = len(text_lower)
+    for connector in connectors:
+        idx = text_lower.find(connector, verb_end)
+        if 0 <= idx < conn_idx:
+            conn_idx, pos = idx, idx + len(connector)
+    if pos < 0:
+        return None
+
+    length = len(text_lower)
+    while pos < length and text_lower[pos].isspace():
+        pos += 1
+    start = pos
+    while pos < length and text_lower[pos].isdecimal():
+        pos += 1
+    if pos == start:
+        return None
+    number = int(text_lower[start:pos])
+    while pos < length and text_lower[pos].isspace():
+        pos += 1
+
+    return number if text_lower.startswith(units, pos) else None
+
+
+def _pluralize_ru(n: int, forms: Tuple[str, str, str]) -> str:
+    """Pick the Russian plural form for n: (1 час, 2 часа, 5 часов)."""
+    n = abs(n) % 100
+    if 11 <= n <= 19:
+        return forms[2]
+    n %= 10
+    if n == 1:
+        return forms[0]
+    if 2 <= n <= 4:
+        return forms[1]
+    return forms[2]
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared background loop, starting its thread on first use."""
+    global _bg_loop
+    with _bg_loop_lock:
+        if _bg_loop is None:
+            _bg_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_bg_loop.run_forever,
+                name="eva-commands-loop",
+                daemon=True
+            ).start()
+    return _bg_loop
+
+
+def _run_in_background(coro, timeout: float = SMART_HOME_TIMEOUT):
+    """Run a coroutine on the background loop and wait for its result."""
+    future = asyncio.run_coroutine_threadsafe(coro, _get_background_loop())
+    try:
+        return future.result(timeout=timeout)
+    except Exception:
+        future.cancel()
+        raise
+
 
 class CommandResult:
     """Result of command parsing."""
@@ -231,6 +363,7 @@ class CommandParser:
         - execute: Whether to also process with LLM
         """
         text = text.strip()
+        text_lower = text.lower()
 
         # Check for time query
         if self.TIME_QUERY.search(text):
@@ -238,22 +371,22 @@ class CommandParser:
             return CommandResult(
                 is_command=True,
                 command_type="time",
-                response=f"Сейчас {now.strftime('%H:%M')}",
+                response=_TEMPLATES["time"].format(time=now.strftime('%H:%M')),
                 execute=False
             )
 
         # Check for date query
         if self.DATE_QUERY.search(text):
             now = datetime.now()
-            weekdays_ru = ['понедельник', 'вторник', 'среда', 'четверг', 'пятница', 'суббота', 'воскресенье']
-            months_ru = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
-                        'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря']
-            weekday = weekdays_ru[now.weekday()]
-            month = months_ru[now.month - 1]
             return CommandResult(
                 is_command=True,
                 command_type="date",
-                response=f"Сегодня {weekday}, {now.day} {month} {now.year} года",
+                response=_TEMPLATES["date"].format(
+                    weekday=_WEEKDAYS_RU[now.weekday()],
+                    day=now.day,
+                    month=_MONTHS_RU[now.month - 1],
+                    year=now.year
+                ),
                 execute=False
             )
 
@@ -264,12 +397,12 @@ class CommandParser:
             reminder_text = match.group(2).strip()
 
             # Determine if minutes or hours
-            if any(u in text.lower() for u in ['час', 'hour', 'hr']):
+            if any(u in text_lower for u in ('час', 'hour', 'hr')):
                 minutes = amount * 60
-                time_str = f"{amount} час" + ("а" if 2 <= amount <= 4 else "ов" if amount >= 5 else "")
+                unit = _pluralize_ru(amount, _HOUR_FORMS)
             else:
                 minutes = amount
-                time_str = f"{amount} минут"
+                unit = _pluralize_ru(amount, _MINUTE_FORMS)
 
             run_at = datetime.now() + timedelta(minutes=minutes)
 
@@ -282,14 +415,16 @@ class CommandParser:
                     "minutes": minutes,
                     "run_at": run_at
                 },
-                response=f"Хорошо, напомню тебе через {time_str}: \"{reminder_text}\"",
+                response=_TEMPLATES["reminder_text"].format(n=amount, unit=unit, text=reminder_text),
                 execute=False
             )
 
         # Check for simple reminder (minutes)
-        match = self.MINUTES_PATTERN.search(text)
-        if match:
-            minutes = int(match.group(1))
+        minutes = _parse_number_after(text_lower, _REMINDER_VERBS, _REMINDER_CONNECTORS, _MINUTE_UNITS)
+        if minutes is None:
+            match = self.MINUTES_PATTERN.search(text)
+            minutes = int(match.group(1)) if match else None
+        if minutes is not None:
             run_at = datetime.now() + timedelta(minutes=minutes)
 
             return CommandResult(
@@ -297,18 +432,20 @@ class CommandParser:
                 command_type="reminder",
                 params={
                     "user_id": user_id,
-                    "message": "Время пришло!",
+                    "message": _TEMPLATES["reminder_message"],
                     "minutes": minutes,
                     "run_at": run_at
                 },
-                response=f"Окей, напомню через {minutes} минут!",
+                response=_TEMPLATES["reminder"].format(n=minutes, unit=_pluralize_ru(minutes, _MINUTE_FORMS)),
                 execute=False
             )
 
         # Check for simple reminder (hours)
-        match = self.HOURS_PATTERN.search(text)
-        if match:
-            hours = int(match.group(1))
+        hours = _parse_number_after(text_lower, _REMINDER_VERBS, _REMINDER_CONNECTORS, _HOUR_UNITS)
+        if hours is None:
+            match = self.HOURS_PATTERN.search(text)
+            hours = int(match.group(1)) if match else None
+        if hours is not None:
             minutes = hours * 60
             run_at = datetime.now() + timedelta(hours=hours)
 
@@ -317,18 +454,21 @@ class CommandParser:
                 command_type="reminder",
                 params={
                     "user_id": user_id,
-                    "message": "Время пришло!",
+                    "message": _TEMPLATES["reminder_message"],
                     "minutes": minutes,
                     "run_at": run_at
                 },
-                response=f"Окей, напомню через {hours} час" + ("а" if 2 <= hours <= 4 else "ов" if hours >= 5 else "") + "!",
+                response=_TEMPLATES["reminder"].format(n=hours, unit=_pluralize_ru(hours, _HOUR_FORMS)),
                 execute=False
             )
 
         # Check for timer
-        match = self.TIMER_PATTERN.search(text)
-        if match:
-            minutes = int(match.group(1))
+        minutes = _parse_number_after(text_lower, _TIMER_VERBS, _TIMER_CONNECTORS, _MINUTE_UNITS)
+        if minutes is None:
+            match = self.TIMER_PATTERN.search(text)
+            minutes = int(match.group(1)) if match else None
+        if minutes is not None:
+            unit = _pluralize_ru(minutes, _MINUTE_FORMS)
             run_at = datetime.now() + timedelta(minutes=minutes)
 
             return CommandResult(
@@ -336,11 +476,11 @@ class CommandParser:
                 command_type="timer",
                 params={
                     "user_id": user_id,
-                    "message": f"Таймер на {minutes} минут завершён!",
+                    "message": _TEMPLATES["timer_message"].format(n=minutes, unit=unit),
                     "minutes": minutes,
                     "run_at": run_at
                 },
-                response=f"Таймер на {minutes} минут запущен!",
+                response=_TEMPLATES["timer"].format(n=minutes, unit=unit),
                 execute=False
             )
 
@@ -355,11 +495,11 @@ class CommandParser:
                 command_type="pomodoro",
                 params={
                     "user_id": user_id,
-                    "message": f"🍅 Помидор завершён! Время для перерыва.",
+                    "message": _TEMPLATES["pomodoro_message"],
                     "minutes": minutes,
                     "run_at": run_at
                 },
-                response=f"🍅 Помидор на {minutes} минут запущен! Фокусируйся, я напомню когда закончится.",
+                response=_TEMPLATES["pomodoro"].format(n=minutes, unit=_pluralize_ru(minutes, _MINUTE_FORMS)),
                 execute=False
             )
 
@@ -374,11 +514,11 @@ class CommandParser:
                 command_type="break",
                 params={
                     "user_id": user_id,
-                    "message": "☕ Перерыв окончен! Готов к новому помидору?",
+                    "message": _TEMPLATES["break_message"],
                     "minutes": minutes,
                     "run_at": run_at
                 },
-                response=f"☕ Отдыхай {minutes} минут. Я скажу когда пора возвращаться.",
+                response=_TEMPLATES["break"].format(n=minutes, unit=_pluralize_ru(minutes, _MINUTE_FORMS)),
                 execute=False
             )
 
@@ -707,6 +847,19 @@ def execute_command(result: CommandResult) -> Tuple[bool, Optional[str]]:
     return True, result.response
 
 
+async def _get_ha_states(ha) -> dict:
+    """Get Home Assistant device list, cached for HA_STATES_TTL seconds."""
+    global _ha_states_cache
+    now = time.monotonic()
+    if _ha_states_cache and now - _ha_states_cache[0] < HA_STATES_TTL:
+        return _ha_states_cache[1]
+
+    states = await ha.execute("list_devices", {})
+    if states.get("success"):
+        _ha_states_cache = (now, states)
+    return states
+
+
 def execute_smart_home_command(result: CommandResult) -> Tuple[bool, str]:
     """Execute smart home command through integrations."""
     try:
@@ -719,43 +872,19 @@ def execute_smart_home_command(result: CommandResult) -> Tuple[bool, str]:
         # Try Home Assistant first
         ha = registry.get("home_assistant")
         if ha and ha.is_connected:
-            import asyncio
-
-            # Find entity by name
             async def do_action():
-                if action == "turn_on":
-                    # Try to find entity
-                    states = await ha.execute("list_devices", {})
-                    entity_id = find_entity_by_name(states, device)
-                    if entity_id:
-                        return await ha.execute("turn_on", {"entity_id": entity_id})
-                    return {"success": False, "message": f"Устройство '{device}' не найдено"}
-
-                elif action == "turn_off":
-                    states = await ha.execute("list_devices", {})
-                    entity_id = find_entity_by_name(states, device)
-                    if entity_id:
-                        return await ha.execute("turn_off", {"entity_id": entity_id})
-                    return {"success": False, "message": f"Устройство '{device}' не найдено"}
+                if action not in ("turn_on", "turn_off", "get_state"):
+                    return {"success": False, "message": "Unknown action"}
 
-                elif action == "get_state":
-                    states = await ha.execute("list_devices", {})
-                    entity_id = find_entity_by_name(states, device)
-                    if entity_id:
-                        return await ha.execute("get_state", {"entity_id": entity_id})
+                # Find entity by name
+                states = await _get_ha_states(ha)
+                entity_id = find_entity_by_name(states, device)
+                if not entity_id:
                     return {"success": False, "message": f"Устройство '{device}' не найдено"}
 
-                return {"success": False, "message": "Unknown action"}
+                return await ha.execute(action, {"entity_id": entity_id})
 
-            # Run async function
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                import concurrent.futures
-                with concurrent.futures.ThreadPoolExecutor() as pool:
-                    future = pool.submit(asyncio.run, do_action())
-                    result_data = future.result()
-            else:
-                result_data = loop.run_until_complete(do_action())
+            result_data = _run_in_background(do_action())
 
             if result_data.get("success"):
                 if action == "turn_on":
@@ -772,19 +901,7 @@ def execute_smart_home_command(result: CommandResult) -> Tuple[bool, str]:
         # Try MQTT
         mqtt = registry.get("mqtt")
         if mqtt and mqtt.is_connected:
-            import asyncio
-
-            async def do_mqtt_action():
-                return await mqtt.execute(action, {"device": device})
-
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                import concurrent.futures
-                with concurrent.futures.ThreadPoolExecutor() as pool:
-                    future = pool.submit(asyncio.run, do_mqtt_action())
-                    result_data = future.result()
-            else:
-                result_data = loop.run_until_complete(do_mqtt_action())
+            result_data = _run_in_background(mqtt.execute(action, {"device": device}))
 
             if result_data.get("success"):
                 return True, f"✅ {action} {device}"
@@ -798,32 +915,51 @@ def execute_smart_home_command(result: CommandResult) -> Tuple[bool, str]:
         return False, f"Ошибка: {str(e)}"
 
 
+def _build_entity_index(states_result: dict) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Build lookup tables for a list_devices result.
+
+    Returns ({lowercased name or entity_id: entity_id}, [lookup keys]).
+    The index is stored on the result so cached device lists only build it once.
+    """
+    index = states_result.get("_index")
+    if index is not None:
+        return index
+
+    lookup: Dict[str, str] = {}
+    entity_ids: Dict[str, str] = {}
+    for columns in states_result.get("devices", {}).values():
+        for entity_id, name in zip(columns["entity_ids"], columns["names"]):
+            lookup.setdefault(name.lower(), entity_id)
+            entity_ids[entity_id.lower()] = entity_id
+
+    # Friendly names take precedence over entity ids
+    for key, entity_id in entity_ids.items():
+        lookup.setdefault(key, entity_id)
+
+    index = (lookup, list(lookup))
+    states_result["_index"] = index
+    return index
+
+
 def find_entity_by_name(states_result: dict, name: str) -> Optional[str]:
     """Find Home Assistant entity ID by friendly name."""
     if not states_result.get("success"):
         return None
 
     name_lower = name.lower()
-    devices = states_result.get("devices", {})
+    lookup, choices = _build_entity_index(states_result)
 
-    for domain, entities in devices.items():
-        for entity in entities:
-            entity_name = entity.get("name", "").lower()
-            entity_id = entity.get("entity_id", "")
+    # Exact match
+    entity_id = lookup.get(name_lower)
+    if entity_id:
+        return entity_id
 
-            # Exact match
-            if entity_name == name_lower:
-                return entity_id
-
-            # Partial match
-            if name_lower in entity_name or entity_name in name_lower:
-                return entity_id
-
-            # Check entity_id
-            if name_lower in entity_id.lower():
-                return entity_id
-
-    return None
+    # Near match on names and entity ids ("лампу" -> "Лампа", "tv" -> "switch.tv")
+    match = process.extractOne(
+        name_lower, choices, scorer=fuzz.WRatio, score_cutoff=ENTITY_MATCH_CUTOFF
+    )
+    return lookup[match[0]] if match else None
 
 
 def execute_weather_command(result: CommandResult) -> Tuple[bool, str]:
@@ -1137,11 +1273,6 @@ def execute_learning_command(result: CommandResult) -> Tuple[bool, str]:
 
 
 # Singleton
-_parser = None
-
-
+@lru_cache()
 def get_command_parser() -> CommandParser:
-    global _parser
-    if _parser is None:
-        _parser = CommandParser()
-    return _parser
+    return CommandParser()
@@ -1,11 +1,15 @@
 """Habit tracker for EVA - track daily habits and build streaks."""
 
-import json
+import asyncio
 import os
 import logging
+import secrets
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
 from dataclasses import dataclass, asdict
+from functools import lru_cache
+
+import orjson
 
 logger = logging.getLogger("eva.habits")
 
@@ -48,50 +52,132 @@ class HabitLog:
 class HabitTracker:
     """Tracks habits and streaks."""
 
+    FLUSH_INTERVAL = 1.0  # seconds between write-behind flushes
+
     def __init__(self, data_dir: str = "data"):
         self.data_dir = data_dir
         self.habits_dir = os.path.join(data_dir, "habits")
         os.makedirs(self.habits_dir, exist_ok=True)
 
+        # In-memory state keyed by user_id, flushed to disk by _flush_loop
+        self._habits_cache: Dict[str, List[Habit]] = {}
+        self._logs_cache: Dict[str, List[HabitLog]] = {}
+        self._logs_index: Dict[str, Dict[Tuple[str, str], HabitLog]] = {}
+        self._dirty_habits: Set[str] = set()
+        self._dirty_logs: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+
     def _get_habits_file(self, user_id: str) -> str:
         return os.path.join(self.habits_dir, f"{user_id}_habits.json")
 
     def _get_logs_file(self, user_id: str) -> str:
         return os.path.join(self.habits_dir, f"{user_id}_logs.json")
 
+    def _write_file(self, file_path: str, items: list):
+        """Atomically replace file_path with the serialized items."""
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps([i.to_dict() for i in items], option=orjson.OPT_INDENT_2))
+        os.replace(tmp_path, file_path)
+
     def _load_habits(self, user_id: str) -> List[Habit]:
+        if user_id in self._habits_cache:
+            return self._habits_cache[user_id]
+
         file_path = self._get_habits_file(user_id)
-        if not os.path.exists(file_path):
-            return []
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [Habit.from_dict(h) for h in data]
-        except Exception as e:
-            logger.error(f"Error loading habits: {e}")
-            return []
+        habits = []
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, 'rb') as f:
+                    habits = [Habit.from_dict(h) for h in orjson.loads(f.read())]
+            except Exception as e:
+                logger.error(f"Error loading habits: {e}")
+                return []
+
+        self._habits_cache[user_id] = habits
+        return habits
 
     def _save_habits(self, user_id: str, habits: List[Habit]):
-        file_path = self._get_habits_file(user_id)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump([h.to_dict() for h in habits], f, ensure_ascii=False, indent=2)
+        self._habits_cache[user_id] = habits
+        if self._flush_task is None:
+            self._write_file(self._get_habits_file(user_id), habits)
+        else:
+            self._dirty_habits.add(user_id)
 
     def _load_logs(self, user_id: str) -> List[HabitLog]:
+        if user_id in self._logs_cache:
+            return self._logs_cache[user_id]
+
         file_path = self._get_logs_file(user_id)
-        if not os.path.exists(file_path):
-            return []
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [HabitLog.from_dict(l) for l in data]
-        except Exception as e:
-            logger.error(f"Error loading habit logs: {e}")
-            return []
+        logs = []
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, 'rb') as f:
+                    logs = [HabitLog.from_dict(l) for l in orjson.loads(f.read())]
+            except Exception as e:
+                logger.error(f"Error loading habit logs: {e}")
+                return []
+
+        self._logs_cache[user_id] = logs
+        return logs
+
+    def _get_logs_index(self, user_id: str) -> Dict[Tuple[str, str], HabitLog]:
+        """Get user's logs keyed by (habit_id, date)."""
+        index = self._logs_index.get(user_id)
+        if index is None:
+            index = {(l.habit_id, l.date): l for l in self._load_logs(user_id)}
+            self._logs_index[user_id] = index
+        return index
 
     def _save_logs(self, user_id: str, logs: List[HabitLog]):
-        file_path = self._get_logs_file(user_id)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump([l.to_dict() for l in logs], f, ensure_ascii=False, indent=2)
+        if logs is not self._logs_cache.get(user_id):
+            self._logs_index.pop(user_id, None)
+        self._logs_cache[user_id] = logs
+        if self._flush_task is None:
+            self._write_file(self._get_logs_file(user_id), logs)
+        else:
+            self._dirty_logs.add(user_id)
+
+    # ============== Persistence ==============
+
+    def flush(self):
+        """Write all dirty habit and log files to disk."""
+        while self._dirty_habits:
+            user_id = self._dirty_habits.pop()
+            try:
+                self._write_file(self._get_habits_file(user_id), self._habits_cache[user_id])
+            except Exception as e:
+                logger.error(f"Error saving habits for {user_id}: {e}")
+
+        while self._dirty_logs:
+            user_id = self._dirty_logs.pop()
+            try:
+                self._write_file(self._get_logs_file(user_id), self._logs_cache[user_id])
+            except Exception as e:
+                logger.error(f"Error saving habit logs for {user_id}: {e}")
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            # Serialize and write off the event loop
+            await loop.run_in_executor(None, self.flush)
+
+    def start(self):
+        """Start coalescing writes in the background (requires a running loop)."""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the background flusher and persist pending changes."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await asyncio.to_thread(self.flush)
 
     # ============== Habits ==============
 
@@ -100,7 +186,7 @@ class HabitTracker:
         habits = self._load_habits(user_id)
 
         habit = Habit(
-            id=f"habit_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(habits)}",
+            id=f"habit_{secrets.token_hex(6)}",
             name=name,
             description=description,
             frequency=frequency,
@@ -142,9 +228,10 @@ class HabitTracker:
 
         # Find habit
         habit = None
+        name_lower = habit_name.lower() if habit_name else None
         for h in habits:
             if (habit_id and h.id == habit_id) or \
-               (habit_name and habit_name.lower() in h.name.lower()):
+               (name_lower and name_lower in h.name.lower()):
                 habit = h
                 break
 
@@ -152,15 +239,16 @@ class HabitTracker:
             return None
 
         logs = self._load_logs(user_id)
+        index = self._get_logs_index(user_id)
         today = datetime.now().strftime('%Y-%m-%d')
 
         # Check if already logged today
-        for log in logs:
-            if log.habit_id == habit.id and log.date == today:
-                log.completed = True
-                log.note = note
-                self._save_logs(user_id, logs)
-                return log
+        log = index.get((habit.id, today))
+        if log:
+            log.completed = True
+            log.note = note
+            self._save_logs(user_id, logs)
+            return log
 
         # Create new log
         log = HabitLog(
@@ -170,6 +258,7 @@ class HabitTracker:
             note=note
         )
         logs.append(log)
+        index[(habit.id, today)] = log
         self._save_logs(user_id, logs)
 
         logger.info(f"Logged habit {habit.name} for {user_id}")
@@ -207,16 +296,15 @@ class HabitTracker:
     def get_today_status(self, user_id: str) -> Dict[str, Any]:
         """Get today's habit completion status."""
         habits = self.get_habits(user_id)
-        logs = self._load_logs(user_id)
+        index = self._get_logs_index(user_id)
         today = datetime.now().strftime('%Y-%m-%d')
 
-        today_logs = {l.habit_id: l for l in logs if l.date == today}
-
         status = []
         completed_count = 0
 
         for habit in habits:
-            is_done = habit.id in today_logs and today_logs[habit.id].completed
+            log = index.get((habit.id, today))
+            is_done = bool(log and log.completed)
             streak = self.get_streak(user_id, habit)
 
             if is_done:
@@ -278,13 +366,8 @@ class HabitTracker:
 
 
 # Singleton
-_habit_tracker: Optional[HabitTracker] = None
-
-
+@lru_cache()
 def get_habit_tracker() -> HabitTracker:
-    global _habit_tracker
-    if _habit_tracker is None:
-        from config import get_settings
-        settings = get_settings()
-        _habit_tracker = HabitTracker(settings.data_dir)
-    return _habit_tracker
+    from config import get_settings
+    settings = get_settings()
+    return HabitTracker(settings.data_dir)
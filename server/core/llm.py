@@ -1,11 +1,180 @@
 """LLM service supporting multiple providers (Gemini, Claude)."""
 
+import asyncio
+import logging
+import re
+import time
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from functools import lru_cache
+from typing import AsyncIterator, List, Optional
 from datetime import datetime
 
 from config import get_settings, get_api_key, get_llm_provider
-from schemas.models import Message, UserProfile, Emotion
+from schemas.models import Message, UserProfile, Emotion, OnboardingStage
+
+logger = logging.getLogger("eva.llm")
+
+# Provider SDKs are imported once here rather than when a provider is created
+try:
+    import google.generativeai as genai
+except ImportError:
+    genai = None
+    logger.info("google-generativeai not installed, Gemini provider disabled")
+
+try:
+    import anthropic
+except ImportError:
+    anthropic = None
+    logger.info("anthropic not installed, Claude provider disabled")
+
+# API key genai was last configured with (genai.configure is process-global)
+_genai_api_key: Optional[str] = None
+
+# Hour of day -> time of day label used in the system prompt
+TIME_BUCKETS = tuple(
+    "утро" if 5 <= hour < 12 else "день" if 12 <= hour < 17 else "вечер" if 17 <= hour < 22 else "ночь"
+    for hour in range(24)
+)
+
+# Semantic cache: only used for the opening message of a conversation (no
+# recent history), where the answer cannot depend on earlier turns, and never
+# for short messages like "да" / "почему?" that carry too little meaning
+CACHE_MIN_MESSAGE_CHARS = 12
+
+# Response keywords per emotion, in priority order
+EMOTION_RE = re.compile(
+    r"(?P<excited>круто|отлично|супер|класс|ура|!)|"
+    r"(?P<supportive>понимаю|сочувствую|держись|всё будет)|"
+    r"(?P<playful>хах|хех|шучу|прикол)|"
+    r"(?P<concerned>ты как|всё хорошо|беспокоюсь)|"
+    r"(?P<calm>спокойно|не спеши|расслабься)",
+    re.IGNORECASE
+)
+EMOTION_ORDER = (Emotion.EXCITED, Emotion.SUPPORTIVE, Emotion.PLAYFUL, Emotion.CONCERNED, Emotion.CALM)
+EMOTION_PRIORITY = {emotion.value: i for i, emotion in enumerate(EMOTION_ORDER)}
+
+# (expires_at monotonic, (time_of_day, "HH:MM")), refreshed once per minute
+_clock_cache: tuple = (0.0, ("", ""))
+
+
+def _get_clock() -> tuple:
+    """Return (time_of_day, "HH:MM") for the prompt, recomputed only when the minute changes."""
+    global _clock_cache
+    mono = time.monotonic()
+    if mono < _clock_cache[0]:
+        return _clock_cache[1]
+
+    now = datetime.now()
+    clock = (TIME_BUCKETS[now.hour], f"{now.hour:02d}:{now.minute:02d}")
+    _clock_cache = (mono + 60 - now.second - now.microsecond / 1e6, clock)
+    return clock
+
+
+ONBOARDING_STAGES = frozenset({"not_started", "greeting", "name", "preferences", "schedule", "motivation_style"})
+
+# Personality and rules, identical for every turn
+STATIC_PROMPT_BODY = """Ты — {eva_name}, персональный AI-компаньон.
+
+ХАРАКТЕР:
+- Ты мягкая, поддерживающая боевая подруга
+- Дружелюбная, с лёгким юмором
+- Никогда не давишь, не осуждаешь, не критикуешь
+- Поддерживаешь и подбадриваешь
+- Лаконична: 1-3 предложения для простых вопросов, больше только если нужно
+
+ЗАПРЕЩЕНО:
+- Говорить "хватит прокрастинировать" или подобное
+- Давить, стыдить, упрекать
+- Быть формальной или роботизированной
+- Использовать канцеляризмы
+- Начинать ответ с "Привет" если пользователь не поздоровался
+
+ПРАВИЛА:
+- Отвечай на языке, на котором к тебе обратились
+- Если обратились на русском — отвечай на русском
+- Если на английском — на английском
+- Учитывай время суток и контекст
+- Если не знаешь — честно скажи
+
+ТЕКУЩИЙ КОНТЕКСТ:
+"""
+
+
+@lru_cache(maxsize=256)
+def _profile_block(profile_key: tuple) -> str:
+    """Profile-dependent tail of the system prompt (see LLMService._profile_key)."""
+    motivation_style, stage, onboarding_day, effective, ineffective, notes = profile_key
+
+    onboarding_context = ""
+    if stage in ONBOARDING_STAGES:
+        onboarding_context = """
+РЕЖИМ ОНБОРДИНГА:
+Ты сейчас знакомишься с пользователем. Задавай вопросы по одному, не перегружай.
+- Если ещё не знаешь имя — спроси как его зовут
+- Если знаешь имя, но не знаешь как обращаться — уточни
+- Спрашивай о предпочтениях постепенно, в контексте разговора
+"""
+    elif stage == "settling_in":
+        onboarding_context = f"""
+РЕЖИМ ПРИТИРКИ (день {onboarding_day}/5):
+Ты всё ещё изучаешь пользователя. Больше слушай, меньше советуй.
+Можешь иногда спрашивать: "Как тебе такой подход?" или "Это было полезно?"
+"""
+
+    approach_notes = ""
+    if effective:
+        approach_notes += f"\nЧто работает: {', '.join(effective)}"
+    if ineffective:
+        approach_notes += f"\nЧто НЕ работает: {', '.join(ineffective)}"
+
+    personal_context = ""
+    if notes:
+        personal_context = f"\nЗаметки о пользователе: {'; '.join(notes)}"
+
+    return f"""- Стиль мотивации: {motivation_style}
+{onboarding_context}
+{approach_notes}
+{personal_context}
+
+Помни: ты не просто ассистент, ты боевая подруга. Будь живой, тёплой, настоящей."""
+
+
+# Proactive message prompts by trigger, formatted with the user's name
+PROACTIVE_PROMPTS = {
+    "morning": "Сгенерируй короткое (1-2 предложения) доброе утреннее приветствие для {name}. Будь тёплой и позитивной.",
+    "break": "Сгенерируй мягкое напоминание о перерыве для {name}. 1 предложение, заботливо.",
+    "checkin": "Сгенерируй мягкий check-in для {name}, спроси как дела. 1 предложение.",
+    "encouragement": "Сгенерируй подбадривание для {name}. 1-2 предложения, тепло."
+}
+
+PROACTIVE_SYSTEM_PROMPT = "Ты EVA — тёплая, дружелюбная боевая подруга. Отвечай коротко и от души."
+
+
+# Rough characters-per-token ratio used to estimate history size
+CHARS_PER_TOKEN = 4
+
+
+def _trim_history(messages: List[Message], budget: int = 3000) -> List[Message]:
+    """
+    Keep the most recent messages that fit in a token budget.
+
+    Tokens are estimated as len(content) // CHARS_PER_TOKEN. A leading
+    system message is always kept.
+    """
+    head = []
+    if messages and messages[0].role == "system":
+        head = [messages[0]]
+        budget -= len(messages[0].content) // CHARS_PER_TOKEN
+        messages = messages[1:]
+
+    start = len(messages)
+    for msg in reversed(messages):
+        budget -= len(msg.content) // CHARS_PER_TOKEN
+        if budget < 0:
+            break
+        start -= 1
+
+    return head + messages[start:]
 
 
 class BaseLLM(ABC):
@@ -20,32 +189,45 @@ class BaseLLM(ABC):
     ) -> str:
         pass
 
+    async def chat_stream(
+        self,
+        system_prompt: str,
+        messages: List[dict],
+        max_tokens: int = 500
+    ) -> AsyncIterator[str]:
+        """Yield the response in chunks. Providers without streaming yield it whole."""
+        yield await self.chat(system_prompt, messages, max_tokens)
+
 
 class GeminiLLM(BaseLLM):
     """Google Gemini implementation (free tier)."""
 
     def __init__(self, api_key: str):
-        import google.generativeai as genai
+        global _genai_api_key
         settings = get_settings()
-        genai.configure(api_key=api_key)
+        if api_key != _genai_api_key:
+            genai.configure(api_key=api_key)
+            _genai_api_key = api_key
         self.model = genai.GenerativeModel(settings.gemini_model)
 
-    async def chat(
-        self,
-        system_prompt: str,
-        messages: List[dict],
-        max_tokens: int = 500
-    ) -> str:
+    @staticmethod
+    def _build_prompt(system_prompt: str, messages: List[dict]) -> str:
         full_prompt = f"{system_prompt}\n\n"
 
         for msg in messages:
             role = "User" if msg["role"] == "user" else "Assistant"
             full_prompt += f"{role}: {msg['content']}\n"
 
-        full_prompt += "Assistant:"
+        return full_prompt + "Assistant:"
 
-        response = self.model.generate_content(
-            full_prompt,
+    async def chat(
+        self,
+        system_prompt: str,
+        messages: List[dict],
+        max_tokens: int = 500
+    ) -> str:
+        response = await self.model.generate_content_async(
+            self._build_prompt(system_prompt, messages),
             generation_config={
                 "max_output_tokens": max_tokens,
                 "temperature": 0.7,
@@ -54,14 +236,33 @@ class GeminiLLM(BaseLLM):
 
         return response.text
 
+    async def chat_stream(
+        self,
+        system_prompt: str,
+        messages: List[dict],
+        max_tokens: int = 500
+    ) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(
+            self._build_prompt(system_prompt, messages),
+            generation_config={
+                "max_output_tokens": max_tokens,
+                "temperature": 0.7,
+            },
+            stream=True
+        )
+
+        async for chunk in response:
+            if chunk.parts:
+                yield chunk.text
+
 
 class ClaudeLLM(BaseLLM):
     """Anthropic Claude implementation."""
 
     def __init__(self, api_key: str):
-        import anthropic
         settings = get_settings()
-        self.client = anthropic.Anthropic(api_key=api_key)
+        # One async client per provider, so its connection pool is reused across requests
+        self.client = anthropic.AsyncAnthropic(api_key=api_key)
         self.model = settings.anthropic_model
 
     async def chat(
@@ -70,7 +271,7 @@ class ClaudeLLM(BaseLLM):
         messages: List[dict],
         max_tokens: int = 500
     ) -> str:
-        response = self.client.messages.create(
+        response = await self.client.messages.create(
             model=self.model,
             max_tokens=max_tokens,
             system=system_prompt,
@@ -78,6 +279,21 @@ class ClaudeLLM(BaseLLM):
         )
         return response.content[0].text
 
+    async def chat_stream(
+        self,
+        system_prompt: str,
+        messages: List[dict],
+        max_tokens: int = 500
+    ) -> AsyncIterator[str]:
+        async with self.client.messages.stream(
+            model=self.model,
+            max_tokens=max_tokens,
+            system=system_prompt,
+            messages=messages
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
 
 class LLMService:
     """Handles all LLM interactions with provider abstraction."""
@@ -85,22 +301,48 @@ class LLMService:
     def __init__(self):
         settings = get_settings()
         self.eva_name = settings.eva_name
+        self._static_prompt = STATIC_PROMPT_BODY.format(eva_name=self.eva_name)
+        self.history_token_budget = settings.history_token_budget
         self.llm: Optional[BaseLLM] = None
         self.provider_name: Optional[str] = None
+        self.cache = self._create_cache()
         self._initialize()
 
+    def _create_cache(self):
+        """Create the semantic response cache if enabled and available."""
+        settings = get_settings()
+        if not settings.semantic_cache_enabled:
+            return None
+
+        from core.semantic_cache import SemanticCache, SEMANTIC_CACHE_AVAILABLE
+        if not SEMANTIC_CACHE_AVAILABLE:
+            return None
+
+        try:
+            return SemanticCache(
+                model_name=settings.semantic_cache_model,
+                threshold=settings.semantic_cache_threshold
+            )
+        except Exception as e:
+            logger.warning(f"Semantic cache disabled: {e}")
+            return None
+
     def _initialize(self):
         """Initialize the LLM provider."""
         provider = get_llm_provider()
         self.provider_name = provider
 
         if provider == "gemini":
+            if genai is None:
+                raise ValueError("Gemini provider requires the google-generativeai package.")
             api_key = get_api_key("gemini")
             if api_key:
                 self.llm = GeminiLLM(api_key)
             else:
                 raise ValueError("Gemini API key not configured. Use Admin API to set it.")
         else:
+            if anthropic is None:
+                raise ValueError("Claude provider requires the anthropic package.")
             api_key = get_api_key("anthropic")
             if api_key:
                 self.llm = ClaudeLLM(api_key)
@@ -109,90 +351,155 @@ class LLMService:
 
     def _build_system_prompt(self, profile: UserProfile, context: dict = None) -> str:
         """Build EVA's system prompt with personality and context."""
-
         user_name = profile.preferred_name or profile.name or "друг"
+        time_of_day, hh_mm = _get_clock()
 
-        now = datetime.now()
-        hour = now.hour
-        time_of_day = "утро" if 5 <= hour < 12 else "день" if 12 <= hour < 17 else "вечер" if 17 <= hour < 22 else "ночь"
+        return (
+            f"{self._static_prompt}"
+            f"- Пользователь: {user_name}\n"
+            f"- Время: {time_of_day} ({hh_mm})\n"
+            f"{_profile_block(self._profile_key(profile))}"
+        )
 
-        onboarding_context = ""
-        if profile.onboarding_stage.value in ["not_started", "greeting", "name", "preferences", "schedule", "motivation_style"]:
-            onboarding_context = """
-РЕЖИМ ОНБОРДИНГА:
-Ты сейчас знакомишься с пользователем. Задавай вопросы по одному, не перегружай.
-- Если ещё не знаешь имя — спроси как его зовут
-- Если знаешь имя, но не знаешь как обращаться — уточни
-- Спрашивай о предпочтениях постепенно, в контексте разговора
-"""
-        elif profile.onboarding_stage.value == "settling_in":
-            onboarding_context = f"""
-РЕЖИМ ПРИТИРКИ (день {profile.onboarding_day}/5):
-Ты всё ещё изучаешь пользователя. Больше слушай, меньше советуй.
-Можешь иногда спрашивать: "Как тебе такой подход?" или "Это было полезно?"
-"""
+    @staticmethod
+    def _profile_key(profile: UserProfile) -> tuple:
+        """Hashable snapshot of the profile fields used in the system prompt."""
+        return (
+            profile.motivation_style,
+            profile.onboarding_stage.value,
+            profile.onboarding_day,
+            tuple(profile.effective_approaches),
+            tuple(profile.ineffective_approaches),
+            tuple(profile.personal_notes[-5:]),
+        )
 
-        approach_notes = ""
-        if profile.effective_approaches:
-            approach_notes += f"\nЧто работает: {', '.join(profile.effective_approaches)}"
-        if profile.ineffective_approaches:
-            approach_notes += f"\nЧто НЕ работает: {', '.join(profile.ineffective_approaches)}"
+    def _prompt_cache_key(self, profile: UserProfile) -> str:
+        """Key for everything the system prompt depends on, except the exact clock time."""
+        user_name = profile.preferred_name or profile.name
+        return repr((user_name, _get_clock()[0]) + self._profile_key(profile))
 
-        personal_context = ""
-        if profile.personal_notes:
-            personal_context = f"\nЗаметки о пользователе: {'; '.join(profile.personal_notes[-5:])}"
+    async def chat(
+        self,
+        user_message: str,
+        conversation_history: List[Message],
+        profile: UserProfile,
+        context: dict = None
+    ) -> tuple[str, Emotion]:
+        """Generate response to user message."""
 
-        system_prompt = f"""Ты — {self.eva_name}, персональный AI-компаньон.
+        if not self.llm:
+            return "Извини, у меня пока не настроен доступ к AI. Попроси админа добавить API ключ.", Emotion.CONCERNED
 
-ХАРАКТЕР:
-- Ты мягкая, поддерживающая боевая подруга
-- Дружелюбная, с лёгким юмором
-- Никогда не давишь, не осуждаешь, не критикуешь
-- Поддерживаешь и подбадриваешь
-- Лаконична: 1-3 предложения для простых вопросов, больше только если нужно
+        system_prompt, (cache_key, query, cached) = await self._prepare_turn(
+            user_message, conversation_history, profile, context
+        )
+        if cached:
+            return cached
 
-ЗАПРЕЩЕНО:
-- Говорить "хватит прокрастинировать" или подобное
-- Давить, стыдить, упрекать
-- Быть формальной или роботизированной
-- Использовать канцеляризмы
-- Начинать ответ с "Привет" если пользователь не поздоровался
+        messages = self._build_messages(user_message, conversation_history)
 
-ПРАВИЛА:
-- Отвечай на языке, на котором к тебе обратились
-- Если обратились на русском — отвечай на русском
-- Если на английском — на английском
-- Учитывай время суток и контекст
-- Если не знаешь — честно скажи
+        try:
+            response_text = await self.llm.chat(system_prompt, messages)
+            emotion = self._detect_emotion(response_text)
+            if query is not None:
+                self.cache.put(cache_key, query, (response_text, emotion))
+            return response_text, emotion
+        except Exception as e:
+            return f"Ой, что-то пошло не так: {str(e)}", Emotion.CONCERNED
 
-ТЕКУЩИЙ КОНТЕКСТ:
-- Пользователь: {user_name}
-- Время: {time_of_day} ({now.strftime("%H:%M")})
-- Стиль мотивации: {profile.motivation_style}
-{onboarding_context}
-{approach_notes}
-{personal_context}
+    async def chat_stream(
+        self,
+        user_message: str,
+        conversation_history: List[Message],
+        profile: UserProfile,
+        context: dict = None
+    ) -> AsyncIterator[str]:
+        """Generate response to user message, yielding text as it arrives."""
 
-Помни: ты не просто ассистент, ты боевая подруга. Будь живой, тёплой, настоящей."""
+        if not self.llm:
+            yield "Извини, у меня пока не настроен доступ к AI. Попроси админа добавить API ключ."
+            return
 
-        return system_prompt
+        system_prompt, (cache_key, query, cached) = await self._prepare_turn(
+            user_message, conversation_history, profile, context
+        )
+        if cached:
+            yield cached[0]
+            return
 
-    async def chat(
+        messages = self._build_messages(user_message, conversation_history)
+
+        chunks = []
+        try:
+            async for chunk in self.llm.chat_stream(system_prompt, messages):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            yield f"Ой, что-то пошло не так: {str(e)}"
+            return
+
+        if query is not None:
+            response_text = "".join(chunks)
+            self.cache.put(cache_key, query, (response_text, self._detect_emotion(response_text)))
+
+    async def _prepare_turn(
         self,
         user_message: str,
         conversation_history: List[Message],
         profile: UserProfile,
         context: dict = None
-    ) -> tuple[str, Emotion]:
-        """Generate response to user message."""
-
-        if not self.llm:
-            return "Извини, у меня пока не настроен доступ к AI. Попроси админа добавить API ключ.", Emotion.CONCERNED
+    ) -> tuple:
+        """
+        Build the system prompt and look up the semantic cache.
+
+        When the cache is used, the prompt is built on a worker thread while
+        the message is being embedded. Returns (system_prompt, cache_lookup),
+        where cache_lookup is the (cache_key, query, cached) tuple from
+        _check_cache.
+        """
+        if not self._uses_cache(user_message, conversation_history, profile):
+            return self._build_system_prompt(profile, context), (None, None, None)
+
+        return await asyncio.gather(
+            asyncio.to_thread(self._build_system_prompt, profile, context),
+            self._check_cache(user_message, conversation_history, profile)
+        )
 
-        system_prompt = self._build_system_prompt(profile, context)
+    def _uses_cache(self, user_message: str, conversation_history: List[Message], profile: UserProfile) -> bool:
+        """
+        The cache is used only when enabled, after onboarding, for messages that
+        open a conversation, and for messages long enough to compare.
+        """
+        return (
+            bool(self.cache)
+            and not conversation_history
+            and profile.onboarding_stage in (OnboardingStage.COMPLETED, OnboardingStage.FULL)
+            and len(user_message.strip()) >= CACHE_MIN_MESSAGE_CHARS
+        )
 
+    async def _check_cache(
+        self,
+        user_message: str,
+        conversation_history: List[Message],
+        profile: UserProfile
+    ) -> tuple:
+        """
+        Look up a cached answer to a near-duplicate message.
+
+        Returns (cache_key, query, cached); cache_key and query are None when
+        the cache is not used for this turn (disabled, onboarding, history
+        present, short message).
+        """
+        if not self._uses_cache(user_message, conversation_history, profile):
+            return None, None, None
+
+        cache_key = self.cache.bucket_key(profile.user_id, self._prompt_cache_key(profile))
+        query = await self.cache.embed(user_message)
+        return cache_key, query, self.cache.get(cache_key, query)
+
+    def _build_messages(self, user_message: str, conversation_history: List[Message]) -> List[dict]:
         messages = []
-        for msg in conversation_history[-15:]:
+        for msg in _trim_history(conversation_history, self.history_token_budget):
             messages.append({
                 "role": msg.role,
                 "content": msg.content
@@ -202,30 +509,20 @@ class LLMService:
             "role": "user",
             "content": user_message
         })
-
-        try:
-            response_text = await self.llm.chat(system_prompt, messages)
-            emotion = self._detect_emotion(response_text)
-            return response_text, emotion
-        except Exception as e:
-            return f"Ой, что-то пошло не так: {str(e)}", Emotion.CONCERNED
+        return messages
 
     def _detect_emotion(self, text: str) -> Emotion:
         """Simple emotion detection from response text."""
-        text_lower = text.lower()
-
-        if any(word in text_lower for word in ["круто", "отлично", "супер", "класс", "ура", "!"]):
-            return Emotion.EXCITED
-        elif any(word in text_lower for word in ["понимаю", "сочувствую", "держись", "всё будет"]):
-            return Emotion.SUPPORTIVE
-        elif any(word in text_lower for word in ["хах", "хех", "шучу", "прикол"]):
-            return Emotion.PLAYFUL
-        elif any(word in text_lower for word in ["ты как", "всё хорошо", "беспокоюсь"]):
-            return Emotion.CONCERNED
-        elif any(word in text_lower for word in ["спокойно", "не спеши", "расслабься"]):
-            return Emotion.CALM
-        else:
-            return Emotion.FRIENDLY
+        # Single scan; earlier groups in EMOTION_RE win over later ones
+        best = None
+        for match in EMOTION_RE.finditer(text):
+            priority = EMOTION_PRIORITY[match.lastgroup]
+            if best is None or priority < best:
+                best = priority
+                if best == 0:
+                    break
+
+        return EMOTION_ORDER[best] if best is not None else Emotion.FRIENDLY
 
     async def generate_proactive_message(
         self,
@@ -240,18 +537,10 @@ class LLMService:
 
         user_name = profile.preferred_name or profile.name or "эй"
 
-        prompts = {
-            "morning": f"Сгенерируй короткое (1-2 предложения) доброе утреннее приветствие для {user_name}. Будь тёплой и позитивной.",
-            "break": f"Сгенерируй мягкое напоминание о перерыве для {user_name}. 1 предложение, заботливо.",
-            "checkin": f"Сгенерируй мягкий check-in для {user_name}, спроси как дела. 1 предложение.",
-            "encouragement": f"Сгенерируй подбадривание для {user_name}. 1-2 предложения, тепло."
-        }
-
-        prompt = prompts.get(trigger, prompts["checkin"])
-        system = "Ты EVA — тёплая, дружелюбная боевая подруга. Отвечай коротко и от души."
+        prompt = PROACTIVE_PROMPTS.get(trigger, PROACTIVE_PROMPTS["checkin"]).format(name=user_name)
 
         try:
-            text = await self.llm.chat(system, [{"role": "user", "content": prompt}], max_tokens=150)
+            text = await self.llm.chat(PROACTIVE_SYSTEM_PROMPT, [{"role": "user", "content": prompt}], max_tokens=150)
             emotion = self._detect_emotion(text)
             return text, emotion
         except Exception:
@@ -259,17 +548,11 @@ class LLMService:
 
 
 # Singleton
-_llm_service = None
-
-
+@lru_cache()
 def get_llm_service() -> LLMService:
-    global _llm_service
-    if _llm_service is None:
-        _llm_service = LLMService()
-    return _llm_service
+    return LLMService()
 
 
 def reset_llm_service():
     """Reset LLM service (used after config change)."""
-    global _llm_service
-    _llm_service = None
+    get_llm_service.cache_clear()
@@ -1,17 +1,24 @@
 """Mood tracking for EVA - tracks user's emotional state over time."""
 
-import json
 import os
 import logging
+import random
+import re
+import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass, asdict
-from collections import Counter
+from functools import lru_cache
+from collections import OrderedDict
+
+import ahocorasick
+import orjson
+import numpy as np
 
 logger = logging.getLogger("eva.mood")
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MoodEntry:
     """A mood entry."""
     timestamp: str
@@ -60,6 +67,36 @@ MOOD_SCORES = {
     "бесит": ("angry", 2),
 }
 
+
+def _build_mood_automaton() -> "ahocorasick.Automaton":
+    """Aho-Corasick automaton over MOOD_SCORES keywords -> (priority, mood, score)."""
+    automaton = ahocorasick.Automaton()
+    for priority, (keyword, (mood, score)) in enumerate(MOOD_SCORES.items()):
+        automaton.add_word(keyword, (priority, mood, score))
+    automaton.make_automaton()
+    return automaton
+
+
+MOOD_AUTOMATON = _build_mood_automaton()
+
+# Numeric self-rating such as "7 из 10", "7/10" or "7 of 10"
+_SCORE_RE = re.compile(r'(\d+)\s*(?:из|/|of)\s*10')
+
+_RNG = random.Random()
+
+MOOD_NAMES = ["happy", "good", "neutral", "tired", "sad", "stressed", "anxious", "angry"]
+MOOD_TO_CODE = {mood: code for code, mood in enumerate(MOOD_NAMES)}
+
+
+def _mood_code(mood: str) -> int:
+    """Integer code for a mood name, registering unknown moods on the fly."""
+    code = MOOD_TO_CODE.get(mood)
+    if code is None:
+        code = MOOD_TO_CODE[mood] = len(MOOD_NAMES)
+        MOOD_NAMES.append(mood)
+    return code
+
+
 MOOD_EMOJI = {
     "happy": "😊",
     "good": "🙂",
@@ -118,42 +155,167 @@ MOOD_RESPONSES = {
 class MoodTracker:
     """Tracks user mood over time."""
 
+    # Entries kept in the live log before it is rotated into the archive
+    MAX_ENTRIES = 1000
+    # Users whose history is kept in memory, and how often (seconds) a cached
+    # history is checked against the file for writes from other processes
+    MAX_CACHED_USERS = 256
+    CACHE_CHECK_INTERVAL = 30
+
     def __init__(self, data_dir: str = "data"):
         self.data_dir = data_dir
         self.mood_dir = os.path.join(data_dir, "mood")
         os.makedirs(self.mood_dir, exist_ok=True)
+        self._line_counts: Dict[str, int] = {}
+        self._cache: "OrderedDict[str, List[MoodEntry]]" = OrderedDict()
+        # user_id -> (last check time, mtime of the live log at that point)
+        self._cache_stamps: Dict[str, tuple] = {}
+        # user_id -> (timestamps, scores, mood codes) arrays for get_stats
+        self._columns: Dict[str, tuple] = {}
 
     def _get_mood_file(self, user_id: str) -> str:
-        return os.path.join(self.mood_dir, f"{user_id}.json")
+        return os.path.join(self.mood_dir, f"{user_id}.jsonl")
 
-    def _load_moods(self, user_id: str) -> List[MoodEntry]:
+    def _get_archive_file(self, user_id: str) -> str:
+        return os.path.join(self.mood_dir, f"{user_id}.archive.jsonl")
+
+    def _migrate_legacy_file(self, user_id: str):
+        """Convert the old {user_id}.json list into the JSONL log."""
+        legacy_path = os.path.join(self.mood_dir, f"{user_id}.json")
         file_path = self._get_mood_file(user_id)
+        if not os.path.exists(legacy_path) or os.path.exists(file_path):
+            return
+        try:
+            with open(legacy_path, 'rb') as f:
+                data = orjson.loads(f.read())
+            tmp_path = f"{file_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                for m in data[-self.MAX_ENTRIES:]:
+                    f.write(orjson.dumps(m, option=orjson.OPT_APPEND_NEWLINE))
+            os.replace(tmp_path, file_path)
+            os.remove(legacy_path)
+            logger.info(f"Migrated mood log for {user_id} to JSONL")
+        except Exception as e:
+            logger.error(f"Error migrating moods: {e}")
+
+    def _read_log(self, file_path: str) -> List[MoodEntry]:
         if not os.path.exists(file_path):
             return []
+        with open(file_path, 'rb') as f:
+            return [MoodEntry.from_dict(orjson.loads(line)) for line in f if line.strip()]
+
+    def _read_from_disk(self, user_id: str) -> List[MoodEntry]:
+        self._migrate_legacy_file(user_id)
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [MoodEntry.from_dict(m) for m in data]
+            current = self._read_log(self._get_mood_file(user_id))
+            self._line_counts[user_id] = len(current)
+            # The live log never reaches MAX_ENTRIES, so fill from the archive
+            archived = self._read_log(self._get_archive_file(user_id))
+            return (archived + current)[-self.MAX_ENTRIES:]
         except Exception as e:
             logger.error(f"Error loading moods: {e}")
             return []
 
-    def _save_moods(self, user_id: str, moods: List[MoodEntry]):
+    def _file_mtime(self, user_id: str) -> Optional[int]:
+        try:
+            return os.stat(self._get_mood_file(user_id)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_moods(self, user_id: str) -> List[MoodEntry]:
+        moods = self._cache.get(user_id)
+        if moods is not None:
+            checked_at, mtime = self._cache_stamps[user_id]
+            now = time.monotonic()
+            if now - checked_at < self.CACHE_CHECK_INTERVAL:
+                self._cache.move_to_end(user_id)
+                return moods
+            if self._file_mtime(user_id) == mtime:
+                self._cache_stamps[user_id] = (now, mtime)
+                self._cache.move_to_end(user_id)
+                return moods
+            # Log changed behind our back, reread it
+            self._line_counts.pop(user_id, None)
+
+        mtime = self._file_mtime(user_id)
+        moods = self._read_from_disk(user_id)
+        self._columns.pop(user_id, None)
+        self._cache[user_id] = moods
+        self._cache_stamps[user_id] = (time.monotonic(), mtime)
+        self._cache.move_to_end(user_id)
+        if len(self._cache) > self.MAX_CACHED_USERS:
+            evicted, _ = self._cache.popitem(last=False)
+            self._cache_stamps.pop(evicted, None)
+            self._columns.pop(evicted, None)
+        return moods
+
+    def _get_columns(self, user_id: str, moods: List[MoodEntry]) -> tuple:
+        """Timestamps (epoch seconds), scores and mood codes as NumPy arrays."""
+        columns = self._columns.get(user_id)
+        if columns is None:
+            columns = (
+                np.array([datetime.fromisoformat(m.timestamp).timestamp() for m in moods], dtype=np.float64),
+                np.array([m.score for m in moods], dtype=np.int16),
+                np.array([_mood_code(m.mood) for m in moods], dtype=np.intp),
+            )
+            self._columns[user_id] = columns
+        return columns
+
+    def _count_lines(self, user_id: str) -> int:
+        if user_id not in self._line_counts:
+            file_path = self._get_mood_file(user_id)
+            if os.path.exists(file_path):
+                with open(file_path, 'rb') as f:
+                    self._line_counts[user_id] = sum(1 for _ in f)
+            else:
+                self._line_counts[user_id] = 0
+        return self._line_counts[user_id]
+
+    def _append_mood(self, user_id: str, entry: MoodEntry):
+        """Append one entry to the log, rotating it into the archive when full."""
+        self._migrate_legacy_file(user_id)
+        count = self._count_lines(user_id)
         file_path = self._get_mood_file(user_id)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump([m.to_dict() for m in moods], f, ensure_ascii=False, indent=2)
+
+        with open(file_path, 'ab') as f:
+            f.write(orjson.dumps(entry.to_dict(), option=orjson.OPT_APPEND_NEWLINE))
+        count += 1
+
+        if count >= self.MAX_ENTRIES:
+            os.replace(file_path, self._get_archive_file(user_id))
+            count = 0
+        self._line_counts[user_id] = count
+
+        # Write-through: keep the cached history in step with the file
+        moods = self._cache.get(user_id)
+        if moods is not None:
+            moods.append(entry)
+            if len(moods) > self.MAX_ENTRIES:
+                del moods[0]
+            columns = self._columns.get(user_id)
+            if columns is not None:
+                ts, scores, codes = columns
+                self._columns[user_id] = (
+                    np.append(ts, datetime.fromisoformat(entry.timestamp).timestamp())[-self.MAX_ENTRIES:],
+                    np.append(scores, np.int16(entry.score))[-self.MAX_ENTRIES:],
+                    np.append(codes, _mood_code(entry.mood))[-self.MAX_ENTRIES:],
+                )
+            self._cache_stamps[user_id] = (time.monotonic(), self._file_mtime(user_id))
 
     def parse_mood(self, text: str) -> Optional[tuple]:
         """Parse mood from text, returns (mood_name, score) or None."""
         text_lower = text.lower()
 
-        for keyword, (mood, score) in MOOD_SCORES.items():
-            if keyword in text_lower:
-                return (mood, score)
+        # Single pass over the text; earlier MOOD_SCORES keywords take priority
+        best = None
+        for _, found in MOOD_AUTOMATON.iter(text_lower):
+            if best is None or found[0] < best[0]:
+                best = found
+        if best:
+            return (best[1], best[2])
 
         # Try to parse numeric score
-        import re
-        match = re.search(r'(\d+)\s*(?:из|/|of)\s*10', text_lower)
+        match = _SCORE_RE.search(text_lower)
         if match:
             score = int(match.group(1))
             score = max(1, min(10, score))
@@ -173,8 +335,6 @@ class MoodTracker:
 
     def log_mood(self, user_id: str, mood: str, score: int, note: str = "") -> MoodEntry:
         """Log a mood entry."""
-        moods = self._load_moods(user_id)
-
         entry = MoodEntry(
             timestamp=datetime.now().isoformat(),
             mood=mood,
@@ -183,31 +343,27 @@ class MoodTracker:
             user_id=user_id
         )
 
-        moods.append(entry)
-
-        # Keep last 1000 entries
-        if len(moods) > 1000:
-            moods = moods[-1000:]
-
-        self._save_moods(user_id, moods)
+        self._append_mood(user_id, entry)
         logger.info(f"Logged mood for {user_id}: {mood} ({score}/10)")
 
         return entry
 
     def get_response(self, mood: str) -> str:
         """Get an empathetic response for a mood."""
-        import random
         responses = MOOD_RESPONSES.get(mood, MOOD_RESPONSES["neutral"])
-        return random.choice(responses)
+        return _RNG.choice(responses)
 
     def get_stats(self, user_id: str, days: int = 7) -> Dict[str, Any]:
         """Get mood statistics for the past N days."""
         moods = self._load_moods(user_id)
+        ts, all_scores, all_codes = self._get_columns(user_id, moods)
 
-        cutoff = datetime.now() - timedelta(days=days)
-        recent = [m for m in moods if datetime.fromisoformat(m.timestamp) > cutoff]
+        cutoff = (datetime.now() - timedelta(days=days)).timestamp()
+        start = int(np.searchsorted(ts, cutoff, side="right"))
+        scores = all_scores[start:]
+        codes = all_codes[start:]
 
-        if not recent:
+        if len(scores) == 0:
             return {
                 "entries": 0,
                 "average_score": None,
@@ -215,25 +371,32 @@ class MoodTracker:
                 "trend": None
             }
 
-        scores = [m.score for m in recent]
-        mood_counts = Counter(m.mood for m in recent)
+        counts = np.bincount(codes, minlength=len(MOOD_NAMES))
+        # Ties go to the mood seen first, like Counter.most_common
+        top = counts == counts.max()
+        most_common = MOOD_NAMES[codes[int(np.argmax(top[codes]))]]
+        first_seen = np.unique(codes, return_index=True)
+        by_mood = {
+            MOOD_NAMES[code]: int(counts[code])
+            for _, code in sorted(zip(first_seen[1], first_seen[0]))
+        }
 
         # Calculate trend (comparing first half to second half)
-        mid = len(recent) // 2
+        mid = len(scores) // 2
         if mid > 0:
-            first_half_avg = sum(m.score for m in recent[:mid]) / mid
-            second_half_avg = sum(m.score for m in recent[mid:]) / (len(recent) - mid)
+            first_half_avg = scores[:mid].mean()
+            second_half_avg = scores[mid:].mean()
             trend = "up" if second_half_avg > first_half_avg + 0.5 else \
                     "down" if second_half_avg < first_half_avg - 0.5 else "stable"
         else:
             trend = "stable"
 
         return {
-            "entries": len(recent),
-            "average_score": round(sum(scores) / len(scores), 1),
-            "most_common": mood_counts.most_common(1)[0][0] if mood_counts else None,
+            "entries": len(scores),
+            "average_score": round(float(scores.mean()), 1),
+            "most_common": most_common,
             "trend": trend,
-            "by_mood": dict(mood_counts)
+            "by_mood": by_mood
         }
 
     def format_stats(self, stats: Dict[str, Any]) -> str:
@@ -282,24 +445,18 @@ class MoodTracker:
 
     def get_mood_prompt(self) -> str:
         """Get a random prompt to ask about mood."""
-        import random
         prompts = [
             "Кстати, как ты себя сегодня чувствуешь?",
             "Как настроение?",
             "Как дела? Правда интересно!",
             "Расскажи, как ты?",
         ]
-        return random.choice(prompts)
+        return _RNG.choice(prompts)
 
 
 # Singleton
-_mood_tracker: Optional[MoodTracker] = None
-
-
+@lru_cache()
 def get_mood_tracker() -> MoodTracker:
-    global _mood_tracker
-    if _mood_tracker is None:
-        from config import get_settings
-        settings = get_settings()
-        _mood_tracker = MoodTracker(settings.data_dir)
-    return _mood_tracker
+    from config import get_settings
+    settings = get_settings()
+    return MoodTracker(settings.data_dir)
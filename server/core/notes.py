@@ -1,12 +1,19 @@
 """Notes and Tasks system for EVA - voice-controlled note taking."""
 
-import json
+import asyncio
+import bisect
+import itertools
 import os
 import logging
+import time
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Optional, Set
+from dataclasses import dataclass
 from enum import Enum
+from itertools import islice
+from types import MappingProxyType
+
+import orjson
 
 logger = logging.getLogger("eva.notes")
 
@@ -25,7 +32,11 @@ class TaskStatus(Enum):
     CANCELLED = "cancelled"
 
 
-@dataclass
+_STATUS_DONE = TaskStatus.DONE.value
+_STATUS_PENDING = TaskStatus.PENDING.value
+
+
+@dataclass(slots=True)
 class Note:
     """A simple note."""
     id: str
@@ -35,14 +46,20 @@ class Note:
     user_id: str
 
     def to_dict(self) -> dict:
-        return asdict(self)
+        return {
+            "id": self.id,
+            "content": self.content,
+            "created_at": self.created_at,
+            "tags": self.tags,
+            "user_id": self.user_id,
+        }
 
     @classmethod
     def from_dict(cls, data: dict) -> "Note":
         return cls(**data)
 
 
-@dataclass
+@dataclass(slots=True)
 class Task:
     """A task/todo item."""
     id: str
@@ -56,16 +73,45 @@ class Task:
     user_id: str
 
     def to_dict(self) -> dict:
-        return asdict(self)
+        return {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "created_at": self.created_at,
+            "due_date": self.due_date,
+            "priority": self.priority,
+            "status": self.status,
+            "tags": self.tags,
+            "user_id": self.user_id,
+        }
 
     @classmethod
     def from_dict(cls, data: dict) -> "Task":
         return cls(**data)
 
 
+PRIORITY_ORDER = MappingProxyType({"urgent": 0, "high": 1, "normal": 2, "low": 3})
+
+
+# format_tasks sections: (priority, header, how many titles to list)
+TASK_GROUPS = (
+    ("urgent", "🔴 Срочные", 3),
+    ("high", "🟠 Важные", 3),
+    ("normal", "🟡 Обычные", 3),
+    ("low", "🟢 Неспешные", 2),
+)
+
+
+def _task_sort_key(task: "Task") -> tuple:
+    """Order tasks by priority, then due date (undated last)."""
+    return (PRIORITY_ORDER.get(task.priority, 2), task.due_date or "9999")
+
+
 class NotesManager:
     """Manages notes and tasks for users."""
 
+    FLUSH_INTERVAL = 1.0  # seconds between write-behind flushes
+
     def __init__(self, data_dir: str = "data"):
         self.data_dir = data_dir
         self.notes_dir = os.path.join(data_dir, "notes")
@@ -73,45 +119,129 @@ class NotesManager:
         os.makedirs(self.notes_dir, exist_ok=True)
         os.makedirs(self.tasks_dir, exist_ok=True)
 
+        # In-memory state keyed by user_id, flushed to disk by _flush_loop
+        self._notes_cache: Dict[str, List[Note]] = {}
+        self._tasks_cache: Dict[str, List[Task]] = {}
+        # Tasks kept in _task_sort_key order, maintained alongside _tasks_cache
+        self._tasks_sorted: Dict[str, List[Task]] = {}
+        self._dirty_notes: Set[str] = set()
+        self._dirty_tasks: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Disambiguates IDs created within the same nanosecond
+        self._id_counter = itertools.count()
+
     def _get_notes_file(self, user_id: str) -> str:
         return os.path.join(self.notes_dir, f"{user_id}.json")
 
     def _get_tasks_file(self, user_id: str) -> str:
         return os.path.join(self.tasks_dir, f"{user_id}.json")
 
+    def _write_file(self, file_path: str, items: list):
+        """Atomically replace file_path with the serialized items."""
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps([i.to_dict() for i in items], option=orjson.OPT_INDENT_2))
+        os.replace(tmp_path, file_path)
+
     def _load_notes(self, user_id: str) -> List[Note]:
+        if user_id in self._notes_cache:
+            return self._notes_cache[user_id]
+
         file_path = self._get_notes_file(user_id)
-        if not os.path.exists(file_path):
-            return []
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [Note.from_dict(n) for n in data]
-        except Exception as e:
-            logger.error(f"Error loading notes: {e}")
-            return []
+        notes = []
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, 'rb') as f:
+                    notes = [Note.from_dict(n) for n in orjson.loads(f.read())]
+            except Exception as e:
+                logger.error(f"Error loading notes: {e}")
+                return []
+
+        self._notes_cache[user_id] = notes
+        return notes
 
     def _save_notes(self, user_id: str, notes: List[Note]):
-        file_path = self._get_notes_file(user_id)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump([n.to_dict() for n in notes], f, ensure_ascii=False, indent=2)
+        self._notes_cache[user_id] = notes
+        if self._flush_task is None:
+            self._write_file(self._get_notes_file(user_id), notes)
+        else:
+            self._dirty_notes.add(user_id)
 
     def _load_tasks(self, user_id: str) -> List[Task]:
+        if user_id in self._tasks_cache:
+            return self._tasks_cache[user_id]
+
         file_path = self._get_tasks_file(user_id)
-        if not os.path.exists(file_path):
-            return []
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [Task.from_dict(t) for t in data]
-        except Exception as e:
-            logger.error(f"Error loading tasks: {e}")
-            return []
+        tasks = []
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, 'rb') as f:
+                    tasks = [Task.from_dict(t) for t in orjson.loads(f.read())]
+            except Exception as e:
+                logger.error(f"Error loading tasks: {e}")
+                return []
+
+        self._tasks_cache[user_id] = tasks
+        return tasks
+
+    def _get_sorted_tasks(self, user_id: str) -> List[Task]:
+        """Get user's tasks ordered by priority and due date."""
+        sorted_tasks = self._tasks_sorted.get(user_id)
+        if sorted_tasks is None:
+            sorted_tasks = sorted(self._load_tasks(user_id), key=_task_sort_key)
+            if user_id in self._tasks_cache:
+                self._tasks_sorted[user_id] = sorted_tasks
+        return sorted_tasks
 
     def _save_tasks(self, user_id: str, tasks: List[Task]):
-        file_path = self._get_tasks_file(user_id)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump([t.to_dict() for t in tasks], f, ensure_ascii=False, indent=2)
+        if tasks is not self._tasks_cache.get(user_id):
+            self._tasks_sorted.pop(user_id, None)
+        self._tasks_cache[user_id] = tasks
+        if self._flush_task is None:
+            self._write_file(self._get_tasks_file(user_id), tasks)
+        else:
+            self._dirty_tasks.add(user_id)
+
+    # ============== Persistence ==============
+
+    def flush(self):
+        """Write all dirty note and task files to disk."""
+        while self._dirty_notes:
+            user_id = self._dirty_notes.pop()
+            try:
+                self._write_file(self._get_notes_file(user_id), self._notes_cache[user_id])
+            except Exception as e:
+                logger.error(f"Error saving notes for {user_id}: {e}")
+
+        while self._dirty_tasks:
+            user_id = self._dirty_tasks.pop()
+            try:
+                self._write_file(self._get_tasks_file(user_id), self._tasks_cache[user_id])
+            except Exception as e:
+                logger.error(f"Error saving tasks for {user_id}: {e}")
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            # Serialize and write off the event loop
+            await loop.run_in_executor(None, self.flush)
+
+    def start(self):
+        """Start coalescing writes in the background (requires a running loop)."""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the background flusher and persist pending changes."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await asyncio.to_thread(self.flush)
 
     # ============== Notes ==============
 
@@ -120,7 +250,7 @@ class NotesManager:
         notes = self._load_notes(user_id)
 
         note = Note(
-            id=f"note_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(notes)}",
+            id=f"note_{time.time_ns()}_{next(self._id_counter)}",
             content=content,
             created_at=datetime.now().isoformat(),
             tags=tags or [],
@@ -137,21 +267,22 @@ class NotesManager:
         """Get user's notes, optionally filtered by tag."""
         notes = self._load_notes(user_id)
 
+        # Notes are stored in creation order, so walk from the end for newest first
         if tag:
-            notes = [n for n in notes if tag.lower() in [t.lower() for t in n.tags]]
+            tag_lower = tag.lower()
+            notes = (n for n in reversed(notes) if any(tag_lower == t.lower() for t in n.tags))
+        else:
+            notes = reversed(notes)
 
-        # Return newest first
-        notes.sort(key=lambda n: n.created_at, reverse=True)
-        return notes[:limit]
+        return list(islice(notes, limit))
 
     def search_notes(self, user_id: str, query: str) -> List[Note]:
         """Search notes by content."""
         notes = self._load_notes(user_id)
         query_lower = query.lower()
 
-        matches = [n for n in notes if query_lower in n.content.lower()]
-        matches.sort(key=lambda n: n.created_at, reverse=True)
-        return matches
+        # Newest first, as in get_notes
+        return [n for n in reversed(notes) if query_lower in n.content.lower()]
 
     def delete_note(self, user_id: str, note_id: str) -> bool:
         """Delete a note."""
@@ -179,18 +310,20 @@ class NotesManager:
         tasks = self._load_tasks(user_id)
 
         task = Task(
-            id=f"task_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(tasks)}",
+            id=f"task_{time.time_ns()}_{next(self._id_counter)}",
             title=title,
             description=description,
             created_at=datetime.now().isoformat(),
             due_date=due_date,
             priority=priority,
-            status=TaskStatus.PENDING.value,
+            status=_STATUS_PENDING,
             tags=tags or [],
             user_id=user_id
         )
 
         tasks.append(task)
+        if user_id in self._tasks_sorted:
+            bisect.insort(self._tasks_sorted[user_id], task, key=_task_sort_key)
         self._save_tasks(user_id, tasks)
 
         logger.info(f"Added task for {user_id}: {title}")
@@ -201,24 +334,18 @@ class NotesManager:
         user_id: str,
         status: str = None,
         priority: str = None,
-        include_done: bool = False
+        include_done: bool = False,
+        limit: Optional[int] = None
     ) -> List[Task]:
-        """Get user's tasks."""
-        tasks = self._load_tasks(user_id)
-
-        if status:
-            tasks = [t for t in tasks if t.status == status]
-        elif not include_done:
-            tasks = [t for t in tasks if t.status != TaskStatus.DONE.value]
-
-        if priority:
-            tasks = [t for t in tasks if t.priority == priority]
-
-        # Sort by priority and due date
-        priority_order = {"urgent": 0, "high": 1, "normal": 2, "low": 3}
-        tasks.sort(key=lambda t: (priority_order.get(t.priority, 2), t.due_date or "9999"))
+        """Get user's tasks, most important first."""
+        # Single filtering pass over the list already ordered by _task_sort_key
+        tasks = (
+            t for t in self._get_sorted_tasks(user_id)
+            if (t.status == status if status else include_done or t.status != _STATUS_DONE)
+            and (not priority or t.priority == priority)
+        )
 
-        return tasks
+        return list(islice(tasks, limit))
 
     def complete_task(self, user_id: str, task_id: str = None, task_title: str = None) -> Optional[Task]:
         """Mark a task as done by ID or title match."""
@@ -226,11 +353,11 @@ class NotesManager:
 
         for task in tasks:
             if task_id and task.id == task_id:
-                task.status = TaskStatus.DONE.value
+                task.status = _STATUS_DONE
                 self._save_tasks(user_id, tasks)
                 return task
             elif task_title and task_title.lower() in task.title.lower():
-                task.status = TaskStatus.DONE.value
+                task.status = _STATUS_DONE
                 self._save_tasks(user_id, tasks)
                 return task
 
@@ -269,33 +396,21 @@ class NotesManager:
         if not tasks:
             return "У тебя нет активных задач. Отличная работа!"
 
-        # Group by priority
-        urgent = [t for t in tasks if t.priority == "urgent"]
-        high = [t for t in tasks if t.priority == "high"]
-        normal = [t for t in tasks if t.priority == "normal"]
-        low = [t for t in tasks if t.priority == "low"]
+        # Group by priority in one pass
+        buckets = {priority: [] for priority in PRIORITY_ORDER}
+        for t in tasks:
+            bucket = buckets.get(t.priority)
+            if bucket is not None:
+                bucket.append(t)
 
         lines = [f"У тебя {len(tasks)} задач:"]
 
-        if urgent:
-            lines.append(f"🔴 Срочные ({len(urgent)}):")
-            for t in urgent[:3]:
-                lines.append(f"  • {t.title}")
-
-        if high:
-            lines.append(f"🟠 Важные ({len(high)}):")
-            for t in high[:3]:
-                lines.append(f"  • {t.title}")
-
-        if normal:
-            lines.append(f"🟡 Обычные ({len(normal)}):")
-            for t in normal[:3]:
-                lines.append(f"  • {t.title}")
-
-        if low:
-            lines.append(f"🟢 Неспешные ({len(low)}):")
-            for t in low[:2]:
-                lines.append(f"  • {t.title}")
+        for priority, header, shown in TASK_GROUPS:
+            group = buckets[priority]
+            if group:
+                lines.append(f"{header} ({len(group)}):")
+                for t in group[:shown]:
+                    lines.append(f"  • {t.title}")
 
         return "\n".join(lines)
 
@@ -2,16 +2,21 @@
 
 import logging
 import asyncio
+import itertools
+import time
 from datetime import datetime
 from typing import Dict, Any, List, Optional, Callable
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from enum import Enum
-import json
 import os
 import aiohttp
+import orjson
 
 logger = logging.getLogger("eva.notifications")
 
+# FCM accepts at most this many registration_ids per request
+FCM_MULTICAST_LIMIT = 1000
+
 
 class NotificationChannel(Enum):
     """Available notification channels."""
@@ -29,7 +34,11 @@ class NotificationPriority(Enum):
     URGENT = "urgent"
 
 
-@dataclass
+# Priorities delivered with FCM "high" priority
+_FCM_HIGH_PRIORITIES = frozenset({NotificationPriority.HIGH, NotificationPriority.URGENT})
+
+
+@dataclass(slots=True)
 class Notification:
     """A notification to send."""
     id: str
@@ -44,10 +53,26 @@ class Notification:
     data: Dict[str, Any] = None
 
     def to_dict(self) -> dict:
-        result = asdict(self)
-        if result['data'] is None:
-            result['data'] = {}
-        return result
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "title": self.title,
+            "message": self.message,
+            "priority": self.priority,
+            "channel": self.channel,
+            "created_at": self.created_at,
+            "sent_at": self.sent_at,
+            "delivered": self.delivered,
+            "data": self.data or {},
+        }
+
+
+@dataclass(slots=True)
+class UserChannels:
+    """Notification targets registered for one user."""
+    telegram: Optional[str] = None  # chat_id
+    firebase: Optional[str] = None  # fcm_token
+    webhook: Optional[str] = None   # webhook_url
 
 
 class NotificationService:
@@ -63,57 +88,108 @@ class NotificationService:
 
     def __init__(self, data_dir: str = "data"):
         self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
         self.config_file = os.path.join(data_dir, "notification_config.json")
-        self.pending_file = os.path.join(data_dir, "pending_notifications.json")
+        # Append-only log of sent notifications; compact_pending() keeps only undelivered ones
+        self.pending_file = os.path.join(data_dir, "pending_notifications.jsonl")
 
-        self.telegram_chat_ids: Dict[str, str] = {}  # user_id -> chat_id
-        self.firebase_tokens: Dict[str, str] = {}    # user_id -> fcm_token
-        self.webhook_urls: Dict[str, str] = {}       # user_id -> webhook_url
+        self._users: Dict[str, UserChannels] = {}
 
         self.in_app_handlers: List[Callable] = []
 
+        # Shared HTTP session for FCM and webhooks, created on first use
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        # Disambiguates notification IDs created within the same nanosecond
+        self._id_counter = itertools.count()
+
+        # FCM request headers built from the vault's server key on first send
+        self._fcm_headers: Optional[Dict[str, str]] = None
+
         self._load_config()
 
     def _load_config(self):
         """Load saved configuration."""
         if os.path.exists(self.config_file):
             try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    self.telegram_chat_ids = config.get("telegram_chat_ids", {})
-                    self.firebase_tokens = config.get("firebase_tokens", {})
-                    self.webhook_urls = config.get("webhook_urls", {})
+                with open(self.config_file, 'rb') as f:
+                    config = orjson.loads(f.read())
+
+                for user_id, chat_id in config.get("telegram_chat_ids", {}).items():
+                    self._user(user_id).telegram = chat_id
+                for user_id, fcm_token in config.get("firebase_tokens", {}).items():
+                    self._user(user_id).firebase = fcm_token
+                for user_id, webhook_url in config.get("webhook_urls", {}).items():
+                    self._user(user_id).webhook = webhook_url
             except Exception as e:
                 logger.error(f"Failed to load notification config: {e}")
 
     def _save_config(self):
         """Save configuration."""
+        # On disk the config keeps one user_id -> target map per channel
         config = {
-            "telegram_chat_ids": self.telegram_chat_ids,
-            "firebase_tokens": self.firebase_tokens,
-            "webhook_urls": self.webhook_urls
+            "telegram_chat_ids": {u: c.telegram for u, c in self._users.items() if c.telegram},
+            "firebase_tokens": {u: c.firebase for u, c in self._users.items() if c.firebase},
+            "webhook_urls": {u: c.webhook for u, c in self._users.items() if c.webhook}
         }
-        os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
+        with open(self.config_file, 'wb') as f:
+            f.write(orjson.dumps(config, option=orjson.OPT_INDENT_2))
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get the shared HTTP session, keeping connections alive between sends."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=64, ttl_dns_cache=300, keepalive_timeout=60)
+            )
+        return self._session
+
+    def _get_fcm_headers(self) -> Optional[Dict[str, str]]:
+        """Get FCM request headers, or None if Firebase is not configured."""
+        if self._fcm_headers is None:
+            from integrations.vault import get_vault
+            fcm_config = get_vault().get("firebase")
+            if not fcm_config or not fcm_config.get("server_key"):
+                return None
+            self._fcm_headers = {
+                "Authorization": f"key={fcm_config['server_key']}",
+                "Content-Type": "application/json"
+            }
+        return self._fcm_headers
+
+    def reload_config(self):
+        """Drop cached Firebase credentials so the next send rereads the vault."""
+        self._fcm_headers = None
+
+    async def close(self):
+        """Close the shared HTTP session."""
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    def _user(self, user_id: str) -> UserChannels:
+        """Get or create the channel entry for a user."""
+        channels = self._users.get(user_id)
+        if channels is None:
+            channels = self._users[user_id] = UserChannels()
+        return channels
 
     # ============== Registration ==============
 
     def register_telegram(self, user_id: str, chat_id: str):
         """Register Telegram chat for notifications."""
-        self.telegram_chat_ids[user_id] = chat_id
+        self._user(user_id).telegram = chat_id
         self._save_config()
         logger.info(f"Registered Telegram for user {user_id}: {chat_id}")
 
     def register_firebase(self, user_id: str, fcm_token: str):
         """Register Firebase token for push notifications."""
-        self.firebase_tokens[user_id] = fcm_token
+        self._user(user_id).firebase = fcm_token
         self._save_config()
         logger.info(f"Registered Firebase token for user {user_id}")
 
     def register_webhook(self, user_id: str, webhook_url: str):
         """Register webhook URL for notifications."""
-        self.webhook_urls[user_id] = webhook_url
+        self._user(user_id).webhook = webhook_url
         self._save_config()
         logger.info(f"Registered webhook for user {user_id}")
 
@@ -140,12 +216,14 @@ class NotificationService:
         if channels is None:
             # Default: try all configured channels
             channels = []
-            if user_id in self.telegram_chat_ids:
-                channels.append(NotificationChannel.TELEGRAM)
-            if user_id in self.firebase_tokens:
-                channels.append(NotificationChannel.FIREBASE)
-            if user_id in self.webhook_urls:
-                channels.append(NotificationChannel.WEBHOOK)
+            user = self._users.get(user_id)
+            if user is not None:
+                if user.telegram:
+                    channels.append(NotificationChannel.TELEGRAM)
+                if user.firebase:
+                    channels.append(NotificationChannel.FIREBASE)
+                if user.webhook:
+                    channels.append(NotificationChannel.WEBHOOK)
             if self.in_app_handlers:
                 channels.append(NotificationChannel.IN_APP)
 
@@ -154,7 +232,7 @@ class NotificationService:
             return {}
 
         notification = Notification(
-            id=f"notif_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            id=f"notif_{time.time_ns()}_{next(self._id_counter)}",
             user_id=user_id,
             title=title,
             message=message,
@@ -164,36 +242,85 @@ class NotificationService:
             data=data or {}
         )
 
-        results = {}
-
-        for channel in channels:
-            try:
-                if channel == NotificationChannel.TELEGRAM:
-                    success = await self._send_telegram(user_id, title, message, priority)
-                    results["telegram"] = success
-
-                elif channel == NotificationChannel.FIREBASE:
-                    success = await self._send_firebase(user_id, title, message, priority, data)
-                    results["firebase"] = success
-
-                elif channel == NotificationChannel.WEBHOOK:
-                    success = await self._send_webhook(user_id, notification)
-                    results["webhook"] = success
+        senders = {
+            NotificationChannel.TELEGRAM: lambda: self._send_telegram(user_id, title, message, priority),
+            NotificationChannel.FIREBASE: lambda: self._send_firebase(user_id, title, message, priority, data),
+            NotificationChannel.WEBHOOK: lambda: self._send_webhook(user_id, notification),
+            NotificationChannel.IN_APP: lambda: self._send_in_app(user_id, notification),
+        }
+        channels = [c for c in channels if c in senders]
 
-                elif channel == NotificationChannel.IN_APP:
-                    success = await self._send_in_app(user_id, notification)
-                    results["in_app"] = success
+        # Channels are independent, so send on all of them at once
+        outcomes = await asyncio.gather(
+            *(senders[channel]() for channel in channels),
+            return_exceptions=True
+        )
 
-            except Exception as e:
-                logger.error(f"Failed to send via {channel.value}: {e}")
+        results = {}
+        for channel, outcome in zip(channels, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Failed to send via {channel.value}: {outcome}")
                 results[channel.value] = False
+            else:
+                results[channel.value] = outcome
 
         # Log result
         success_count = sum(1 for v in results.values() if v)
         logger.info(f"Notification sent to {user_id}: {success_count}/{len(results)} channels")
 
+        if success_count:
+            notification.delivered = True
+            notification.sent_at = datetime.now().isoformat()
+        self._log_notification(notification)
+
         return results
 
+    # ============== Notification log ==============
+
+    def _log_notification(self, notification: Notification):
+        """Append a notification to the log as one JSON line."""
+        try:
+            with open(self.pending_file, 'ab') as f:
+                f.write(orjson.dumps(notification.to_dict(), option=orjson.OPT_APPEND_NEWLINE))
+        except Exception as e:
+            logger.error(f"Failed to log notification: {e}")
+
+    def _read_log(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.pending_file):
+            return []
+        entries = []
+        with open(self.pending_file, 'rb') as f:
+            for line in f:
+                try:
+                    entries.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    pass  # Partially written line
+        return entries
+
+    def get_pending(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get notifications that no channel delivered to the user."""
+        return [
+            n for n in self._read_log()
+            if n.get("user_id") == user_id and not n.get("delivered")
+        ]
+
+    async def compact_pending(self):
+        """
+        Rewrite the log keeping only undelivered notifications.
+
+        Runs on the event loop, like _log_notification, so no append can
+        land between reading and replacing the file.
+        """
+        try:
+            pending = [n for n in self._read_log() if not n.get("delivered")]
+            tmp_path = f"{self.pending_file}.tmp"
+            with open(tmp_path, 'wb') as f:
+                for n in pending:
+                    f.write(orjson.dumps(n, option=orjson.OPT_APPEND_NEWLINE))
+            os.replace(tmp_path, self.pending_file)
+        except Exception as e:
+            logger.error(f"Failed to compact notification log: {e}")
+
     async def _send_telegram(
         self,
         user_id: str,
@@ -202,7 +329,8 @@ class NotificationService:
         priority: NotificationPriority
     ) -> bool:
         """Send via Telegram."""
-        chat_id = self.telegram_chat_ids.get(user_id)
+        user = self._users.get(user_id)
+        chat_id = user.telegram if user else None
         if not chat_id:
             return False
 
@@ -234,69 +362,144 @@ class NotificationService:
         data: Dict[str, Any] = None
     ) -> bool:
         """Send via Firebase Cloud Messaging."""
-        fcm_token = self.firebase_tokens.get(user_id)
+        user = self._users.get(user_id)
+        fcm_token = user.firebase if user else None
         if not fcm_token:
             return False
 
         try:
-            from integrations.vault import get_vault
-            vault = get_vault()
-            fcm_config = vault.get("firebase")
-
-            if not fcm_config or not fcm_config.get("server_key"):
+            fcm_headers = self._get_fcm_headers()
+            if not fcm_headers:
                 logger.warning("Firebase not configured")
                 return False
 
-            server_key = fcm_config["server_key"]
+            payload = {"to": fcm_token, **self._fcm_payload(title, message, priority, data)}
+
+            session = await self._get_session()
+            async with session.post(
+                "https://fcm.googleapis.com/fcm/send",
+                json=payload,
+                headers=fcm_headers
+            ) as resp:
+                if resp.status == 200:
+                    result = await resp.json()
+                    return result.get("success", 0) > 0
+                else:
+                    logger.error(f"FCM error: {resp.status}")
+                    return False
 
-            # FCM priority mapping
-            fcm_priority = "high" if priority in [NotificationPriority.HIGH, NotificationPriority.URGENT] else "normal"
+        except Exception as e:
+            logger.error(f"Firebase notification failed: {e}")
+            return False
 
-            payload = {
-                "to": fcm_token,
-                "priority": fcm_priority,
-                "notification": {
-                    "title": title,
-                    "body": message,
-                    "sound": "default" if priority != NotificationPriority.LOW else None
-                },
-                "data": data or {}
-            }
+    @staticmethod
+    def _fcm_payload(
+        title: str,
+        message: str,
+        priority: NotificationPriority,
+        data: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        """Build the FCM message body shared by single and multicast sends."""
+        # FCM priority mapping
+        fcm_priority = "high" if priority in _FCM_HIGH_PRIORITIES else "normal"
+
+        return {
+            "priority": fcm_priority,
+            "notification": {
+                "title": title,
+                "body": message,
+                "sound": "default" if priority != NotificationPriority.LOW else None
+            },
+            "data": data or {}
+        }
+
+    async def send_multicast(
+        self,
+        user_ids: List[str],
+        message: str,
+        title: str = "EVA",
+        priority: NotificationPriority = NotificationPriority.NORMAL,
+        data: Dict[str, Any] = None
+    ) -> Dict[str, bool]:
+        """
+        Push one notification to many users with FCM multicast requests.
 
-            async with aiohttp.ClientSession() as session:
+        Tokens are sent FCM_MULTICAST_LIMIT at a time in the registration_ids
+        field instead of one request per user.
+
+        Returns dict of user_id -> success status.
+        """
+        targets = [
+            (user_id, self._users[user_id].firebase)
+            for user_id in user_ids
+            if user_id in self._users and self._users[user_id].firebase
+        ]
+        results = {user_id: False for user_id in user_ids}
+        if not targets:
+            return results
+
+        fcm_headers = self._get_fcm_headers()
+        if not fcm_headers:
+            logger.warning("Firebase not configured")
+            return results
+
+        body = self._fcm_payload(title, message, priority, data)
+        session = await self._get_session()
+
+        for start in range(0, len(targets), FCM_MULTICAST_LIMIT):
+            batch = targets[start:start + FCM_MULTICAST_LIMIT]
+            payload = {"registration_ids": [token for _, token in batch], **body}
+            try:
                 async with session.post(
                     "https://fcm.googleapis.com/fcm/send",
                     json=payload,
-                    headers={
-                        "Authorization": f"key={server_key}",
-                        "Content-Type": "application/json"
-                    }
+                    headers=fcm_headers
                 ) as resp:
-                    if resp.status == 200:
-                        result = await resp.json()
-                        return result.get("success", 0) > 0
-                    else:
-                        logger.error(f"FCM error: {resp.status}")
-                        return False
-
-        except Exception as e:
-            logger.error(f"Firebase notification failed: {e}")
-            return False
+                    if resp.status != 200:
+                        logger.error(f"FCM multicast error: {resp.status}")
+                        continue
+                    result = await resp.json()
+            except Exception as e:
+                logger.error(f"Firebase multicast failed: {e}")
+                continue
+
+            # results[i] matches registration_ids[i]; failures carry an "error" key
+            for (user_id, _), token_result in zip(batch, result.get("results", [])):
+                results[user_id] = "message_id" in token_result
+
+        now = datetime.now().isoformat()
+        for user_id, delivered in results.items():
+            self._log_notification(Notification(
+                id=f"notif_{time.time_ns()}_{next(self._id_counter)}",
+                user_id=user_id,
+                title=title,
+                message=message,
+                priority=priority.value,
+                channel=NotificationChannel.FIREBASE.value,
+                created_at=now,
+                delivered=delivered,
+                sent_at=now if delivered else None,
+                data=data or {}
+            ))
+
+        logger.info(f"Multicast sent: {sum(results.values())}/{len(results)} users")
+        return results
 
     async def _send_webhook(self, user_id: str, notification: Notification) -> bool:
         """Send via webhook."""
-        webhook_url = self.webhook_urls.get(user_id)
+        user = self._users.get(user_id)
+        webhook_url = user.webhook if user else None
         if not webhook_url:
             return False
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    webhook_url,
-                    json=notification.to_dict(),
-                    headers={"Content-Type": "application/json"}
-                ) as resp:
-                    return resp.status in [200, 201, 202, 204]
+            session = await self._get_session()
+            async with session.post(
+                webhook_url,
+                json=notification.to_dict(),
+                headers={"Content-Type": "application/json"}
+            ) as resp:
+                return resp.status in [200, 201, 202, 204]
 
         except Exception as e:
             logger.error(f"Webhook notification failed: {e}")
@@ -350,12 +553,16 @@ class NotificationService:
 
     def get_user_channels(self, user_id: str) -> List[str]:
         """Get configured channels for a user."""
+        user = self._users.get(user_id)
+        if user is None:
+            return []
+
         channels = []
-        if user_id in self.telegram_chat_ids:
+        if user.telegram:
             channels.append("telegram")
-        if user_id in self.firebase_tokens:
+        if user.firebase:
             channels.append("firebase")
-        if user_id in self.webhook_urls:
+        if user.webhook:
             channels.append("webhook")
         return channels
 
@@ -0,0 +1,233 @@
+"""Semantic response cache for EVA - reuse answers to near-duplicate messages."""
+
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+logger = logging.getLogger("eva.semantic_cache")
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    SEMANTIC_CACHE_AVAILABLE = True
+except ImportError:
+    SEMANTIC_CACHE_AVAILABLE = False
+    logger.info("sentence-transformers not installed, semantic cache disabled")
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _quantize(vector: "np.ndarray") -> tuple:
+    """Quantize a normalized embedding to int8 with a per-vector scale."""
+    peak = float(np.max(np.abs(vector)))
+    if peak == 0.0:
+        return np.zeros(vector.shape, dtype=np.int8), np.float32(0.0)
+    return np.round(vector * (127.0 / peak)).astype(np.int8), np.float32(peak / 127.0)
+
+
+if SEMANTIC_CACHE_AVAILABLE and NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _best_match(embeddings, scales, query, query_scale):
+        """Index and cosine score of the int8 row closest to the int8 query."""
+        best = -np.inf
+        idx = -1
+        for i in range(embeddings.shape[0]):
+            acc = 0
+            for j in range(embeddings.shape[1]):
+                acc += np.int32(embeddings[i, j]) * np.int32(query[j])
+            score = acc * scales[i] * query_scale
+            if score > best:
+                best = score
+                idx = i
+        return idx, best
+
+    # Compile now so the first lookup doesn't pay for it
+    _best_match(
+        np.zeros((1, 1), dtype=np.int8), np.zeros(1, dtype=np.float32),
+        np.zeros(1, dtype=np.int8), np.float32(0.0)
+    )
+else:
+    def _best_match(embeddings, scales, query, query_scale):
+        """Index and cosine score of the int8 row closest to the int8 query."""
+        sims = np.einsum("ij,j->i", embeddings, query, dtype=np.int32) * scales * query_scale
+        idx = int(np.argmax(sims))
+        return idx, sims[idx]
+
+
+class _Bucket:
+    """Embeddings and cached responses for one (user, prompt) bucket.
+
+    Embeddings are stored as int8 rows with a float32 dequantization scale each.
+    """
+
+    __slots__ = ("embeddings", "scales", "responses", "last_used", "size")
+
+    INITIAL_CAPACITY = 16
+
+    def __init__(self, dim: int):
+        self.embeddings = np.zeros((self.INITIAL_CAPACITY, dim), dtype=np.int8)
+        self.scales = np.zeros(self.INITIAL_CAPACITY, dtype=np.float32)
+        self.responses: List[Any] = [None] * self.INITIAL_CAPACITY
+        self.last_used = np.zeros(self.INITIAL_CAPACITY, dtype=np.int64)
+        self.size = 0
+
+    def grow(self, capacity: int):
+        extra = capacity - len(self.responses)
+        self.embeddings = np.vstack([
+            self.embeddings,
+            np.zeros((extra, self.embeddings.shape[1]), dtype=np.int8)
+        ])
+        self.scales = np.concatenate([self.scales, np.zeros(extra, dtype=np.float32)])
+        self.last_used = np.concatenate([self.last_used, np.zeros(extra, dtype=np.int64)])
+        self.responses.extend([None] * extra)
+
+
+class BatchEmbedder:
+    """
+    Coalesces concurrent embedding requests into batched model calls.
+
+    Requests arriving within batch_wait_timeout_s of each other (or until
+    max_batch_size is reached) are encoded in one model.encode() call on a
+    worker thread.
+    """
+
+    def __init__(self, model, max_batch_size: int = 32, batch_wait_timeout_s: float = 0.002):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.batch_wait_timeout_s = batch_wait_timeout_s
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def embed(self, text: str) -> "np.ndarray":
+        """Embed a message as a normalized float32 vector."""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_wait_timeout_s
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                vectors = await asyncio.to_thread(
+                    self.model.encode,
+                    [text for text, _ in batch],
+                    batch_size=self.max_batch_size,
+                    normalize_embeddings=True
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector.astype(np.float32))
+
+
+class SemanticCache:
+    """
+    Caches LLM responses keyed by sentence embeddings of user messages.
+
+    Messages are embedded with a small local model and compared by cosine
+    similarity against earlier messages in the same bucket; a close enough
+    match returns the stored response instead of calling the provider.
+    Each bucket keeps at most max_entries responses with LRU eviction, and
+    at most max_buckets buckets are kept.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        threshold: float = 0.87,
+        max_entries: int = 1024,
+        max_buckets: int = 64
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_buckets = max_buckets
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.embedder = BatchEmbedder(self.model)
+        self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+        self._tick = 0
+
+        logger.info(f"Semantic cache ready ({model_name}, threshold {threshold})")
+
+    @staticmethod
+    def bucket_key(user_id: str, prompt_key: str) -> str:
+        """Bucket responses per user and per system prompt context."""
+        digest = hashlib.sha1(prompt_key.encode("utf-8")).hexdigest()[:16]
+        return f"{user_id}:{digest}"
+
+    async def embed(self, text: str) -> "np.ndarray":
+        """Embed a message, batched with concurrent requests."""
+        return await self.embedder.embed(text)
+
+    def get(self, bucket_key: str, query: "np.ndarray") -> Optional[Any]:
+        """Return the cached response for the closest message, if similar enough."""
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None or bucket.size == 0:
+            return None
+        self._buckets.move_to_end(bucket_key)
+
+        query_q, query_scale = _quantize(query)
+        idx, score = _best_match(
+            bucket.embeddings[:bucket.size], bucket.scales[:bucket.size], query_q, query_scale
+        )
+        if score < self.threshold:
+            return None
+
+        self._tick += 1
+        bucket.last_used[idx] = self._tick
+        return bucket.responses[idx]
+
+    def put(self, bucket_key: str, query: "np.ndarray", response: Any):
+        """Store a response, evicting the least recently used one if full."""
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            bucket = _Bucket(self.dim)
+            self._buckets[bucket_key] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(bucket_key)
+
+        if bucket.size < self.max_entries:
+            if bucket.size == len(bucket.responses):
+                bucket.grow(min(bucket.size * 2, self.max_entries))
+            idx = bucket.size
+            bucket.size += 1
+        else:
+            idx = int(np.argmin(bucket.last_used))
+
+        self._tick += 1
+        bucket.embeddings[idx], bucket.scales[idx] = _quantize(query)
+        bucket.responses[idx] = response
+        bucket.last_used[idx] = self._tick
+
+    def clear(self):
+        """Drop all cached responses."""
+        self._buckets.clear()
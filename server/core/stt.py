@@ -1,9 +1,10 @@
 """Speech-to-Text service using Faster Whisper."""
 
+import io
 import os
-import tempfile
 from typing import Tuple
-from faster_whisper import WhisperModel
+import numpy as np
+from faster_whisper import WhisperModel, decode_audio
 
 from config import get_settings
 
@@ -13,11 +14,29 @@ class STTService:
 
     def __init__(self):
         settings = get_settings()
+        compute_type = settings.whisper_compute_type
+        if not compute_type:
+            compute_type = "int8" if settings.whisper_device == "cpu" else "int8_float16"
+
+        self.beam_size = settings.whisper_beam_size
         self.model = WhisperModel(
             settings.whisper_model,
             device=settings.whisper_device,
-            compute_type=settings.whisper_compute_type
+            compute_type=compute_type,
+            cpu_threads=settings.whisper_cpu_threads or os.cpu_count() or 0,
+            num_workers=settings.whisper_num_workers
+        )
+
+    def warmup(self):
+        """Run one second of silence through the model so the first request isn't slow."""
+        segments, _ = self.model.transcribe(
+            np.zeros(self.model.feature_extractor.sampling_rate, dtype=np.float32),
+            beam_size=self.beam_size,
+            language="ru"
         )
+        # Segments are generated lazily; consume them to actually run the decoder
+        for _ in segments:
+            pass
 
     async def transcribe(self, audio_data: bytes, filename: str = "audio.wav") -> Tuple[str, str]:
         """
@@ -25,47 +44,40 @@ class STTService:
 
         Args:
             audio_data: Raw audio bytes
-            filename: Original filename (for format detection)
+            filename: Original filename (unused, the format is detected from the data)
 
         Returns:
             Tuple of (transcribed_text, detected_language)
         """
-        # Save to temp file (Whisper needs file path)
-        suffix = os.path.splitext(filename)[1] or ".wav"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(audio_data)
-            tmp_path = tmp.name
-
-        try:
-            # Transcribe with auto language detection
-            segments, info = self.model.transcribe(
-                tmp_path,
-                beam_size=5,
-                language=None,  # Auto-detect
-                vad_filter=True,  # Voice activity detection
-                vad_parameters=dict(
-                    min_silence_duration_ms=500,
-                    speech_pad_ms=200
-                )
+        # Decode in memory to 16 kHz mono float32 (PyAV detects the container format)
+        audio = decode_audio(io.BytesIO(audio_data), sampling_rate=self.model.feature_extractor.sampling_rate)
+
+        # Transcribe with auto language detection
+        segments, info = self.model.transcribe(
+            audio,
+            beam_size=self.beam_size,
+            temperature=0.0,
+            condition_on_previous_text=False,
+            language=None,  # Auto-detect
+            vad_filter=True,  # Voice activity detection
+            vad_parameters=dict(
+                min_silence_duration_ms=500,
+                speech_pad_ms=200
             )
+        )
 
-            # Collect all segments
-            text_parts = []
-            for segment in segments:
-                text_parts.append(segment.text.strip())
-
-            transcribed_text = " ".join(text_parts)
-            detected_language = info.language
+        # Collect all segments
+        text_parts = []
+        for segment in segments:
+            text_parts.append(segment.text.strip())
 
-            # Map to our language enum
-            lang = "ru" if detected_language in ["ru", "russian"] else "en"
+        transcribed_text = " ".join(text_parts)
+        detected_language = info.language
 
-            return transcribed_text, lang
+        # Map to our language enum
+        lang = "ru" if detected_language in ["ru", "russian"] else "en"
 
-        finally:
-            # Cleanup temp file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+        return transcribed_text, lang
 
     async def transcribe_file(self, file_path: str) -> Tuple[str, str]:
         """Transcribe audio from file path."""
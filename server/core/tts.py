@@ -1,13 +1,27 @@
 """Text-to-Speech service using Edge TTS."""
 
+import asyncio
+import hashlib
 import os
-import uuid
+import time
 import edge_tts
-from typing import Optional
+from typing import AsyncIterator, Dict, Optional
 
 from config import get_settings
 
 
+# Edge TTS (rate, pitch) adjustments per emotion
+EMOTION_PROSODY = {
+    "excited": ("+10%", "+5Hz"),
+    "calm": ("-5%", "-2Hz"),
+    "supportive": ("-3%", "+2Hz"),
+    "playful": ("+5%", "+3Hz"),
+}
+
+# Write buffer for synthesized audio files
+WRITE_BUFFER_SIZE = 64 * 1024
+
+
 class TTSService:
     """Converts text to speech using Microsoft Edge TTS."""
 
@@ -17,6 +31,8 @@ class TTSService:
         self.voice_en = settings.tts_voice_en
         self.audio_dir = os.path.join(settings.data_dir, "audio")
         os.makedirs(self.audio_dir, exist_ok=True)
+        # Per-file locks so concurrent requests for the same speech synthesize it once
+        self._locks: Dict[str, asyncio.Lock] = {}
 
     def _get_voice(self, language: str) -> str:
         """Get appropriate voice for language, checking vault for custom settings."""
@@ -54,15 +70,16 @@ class TTSService:
         Returns:
             Path to generated audio file
         """
+        voice = self._get_voice(language)
+
         if not filename:
-            filename = f"{uuid.uuid4()}.mp3"
+            return await self._synthesize_cached(text, voice, "+0%", "+0Hz")
 
         output_path = os.path.join(self.audio_dir, filename)
-        voice = self._get_voice(language)
 
         # Generate speech
         communicate = edge_tts.Communicate(text, voice)
-        await communicate.save(output_path)
+        await self._write_audio(communicate, output_path)
 
         return output_path
 
@@ -77,37 +94,73 @@ class TTSService:
 
         Edge TTS supports SSML for some emotion control.
         """
-        voice = self._get_voice(language)
+        rate, pitch = EMOTION_PROSODY.get(emotion, ("+0%", "+0Hz"))
+        return await self._synthesize_cached(text, self._get_voice(language), rate, pitch)
 
-        # Adjust rate and pitch based on emotion
-        rate = "+0%"
-        pitch = "+0Hz"
-
-        if emotion == "excited":
-            rate = "+10%"
-            pitch = "+5Hz"
-        elif emotion == "calm":
-            rate = "-5%"
-            pitch = "-2Hz"
-        elif emotion == "supportive":
-            rate = "-3%"
-            pitch = "+2Hz"
-        elif emotion == "playful":
-            rate = "+5%"
-            pitch = "+3Hz"
-
-        filename = f"{uuid.uuid4()}.mp3"
-        output_path = os.path.join(self.audio_dir, filename)
+    async def _synthesize_cached(self, text: str, voice: str, rate: str, pitch: str) -> str:
+        """
+        Synthesize to a file named after a hash of the inputs.
 
-        communicate = edge_tts.Communicate(
+        Identical text with the same voice and prosody reuses the existing file.
+        """
+        key = hashlib.blake2b(f"{voice}|{rate}|{pitch}|{text}".encode("utf-8"), digest_size=16).hexdigest()
+        output_path = os.path.join(self.audio_dir, f"{key}.mp3")
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            try:
+                if os.path.getsize(output_path) > 0:
+                    # Refresh mtime so cleanup_old_files keeps phrases still in use
+                    os.utime(output_path)
+                    return output_path
+            except OSError:
+                pass
+
+            tmp_path = f"{output_path}.part"
+            try:
+                await self._write_audio(
+                    edge_tts.Communicate(text, voice, rate=rate, pitch=pitch),
+                    tmp_path
+                )
+                os.replace(tmp_path, output_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+
+        # Later requests will find the file, so the lock is no longer needed
+        if not lock.locked():
+            self._locks.pop(key, None)
+
+        return output_path
+
+    async def stream(
+        self,
+        text: str,
+        language: str = "ru",
+        emotion: str = "friendly"
+    ) -> AsyncIterator[bytes]:
+        """Yield MP3 audio chunks as Edge TTS produces them."""
+        async for chunk in self._communicate(text, language, emotion).stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+
+    def _communicate(self, text: str, language: str, emotion: str) -> edge_tts.Communicate:
+        """Create an Edge TTS request with rate and pitch adjusted for the emotion."""
+        rate, pitch = EMOTION_PROSODY.get(emotion, ("+0%", "+0Hz"))
+        return edge_tts.Communicate(
             text,
-            voice,
+            self._get_voice(language),
             rate=rate,
             pitch=pitch
         )
-        await communicate.save(output_path)
 
-        return output_path
+    @staticmethod
+    async def _write_audio(communicate: edge_tts.Communicate, output_path: str):
+        """Write audio chunks to output_path as they arrive."""
+        with open(output_path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    f.write(chunk["data"])
 
     def get_audio_url(self, file_path: str) -> str:
         """Convert file path to API URL."""
@@ -116,16 +169,16 @@ class TTSService:
 
     def cleanup_old_files(self, max_age_hours: int = 24):
         """Remove audio files older than max_age_hours."""
-        import time
-        now = time.time()
-        max_age_seconds = max_age_hours * 3600
-
-        for filename in os.listdir(self.audio_dir):
-            file_path = os.path.join(self.audio_dir, filename)
-            if os.path.isfile(file_path):
-                file_age = now - os.path.getmtime(file_path)
-                if file_age > max_age_seconds:
-                    os.unlink(file_path)
+        cutoff = time.time() - max_age_hours * 3600
+
+        # DirEntry caches the type and stat results from the directory scan
+        with os.scandir(self.audio_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass  # Removed or replaced concurrently
 
 
 # Singleton instance
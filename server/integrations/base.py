@@ -1,13 +1,30 @@
 """Base classes for EVA integrations - plugin system for smart home, services, etc."""
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from copy import deepcopy
+from typing import Dict, Any, Callable, Iterable, List, Optional
 from dataclasses import dataclass, field
 from enum import Enum
+from functools import cache, lru_cache
+from importlib import import_module
+import asyncio
 import logging
+import re
+import socket
+import time
+import xml.etree.ElementTree as ET
+
+import ahocorasick
 
 logger = logging.getLogger("eva.integrations")
 
+try:
+    from zeroconf import ServiceStateChange
+    from zeroconf.asyncio import AsyncServiceBrowser, AsyncServiceInfo, AsyncZeroconf
+    ZEROCONF_AVAILABLE = True
+except ImportError:
+    ZEROCONF_AVAILABLE = False
+
 
 class IntegrationType(Enum):
     """Types of integrations EVA can handle."""
@@ -28,6 +45,10 @@ class IntegrationCapability:
     description: str                 # Human readable
     parameters: Dict[str, str] = field(default_factory=dict)  # param_name -> type
     example_phrases: List[str] = field(default_factory=list)  # "включи свет", "завари кофе"
+    _example_phrases_lc: tuple = field(init=False, repr=False, compare=False, default=())
+
+    def __post_init__(self):
+        self._example_phrases_lc = tuple(p.lower() for p in self.example_phrases)
 
 
 @dataclass
@@ -109,8 +130,8 @@ class BaseIntegration(ABC):
         """
         phrase_lower = phrase.lower()
         for cap in self.capabilities:
-            for example in cap.example_phrases:
-                if example.lower() in phrase_lower:
+            for example in cap._example_phrases_lc:
+                if example in phrase_lower:
                     return (cap.name, {})
         return None
 
@@ -124,11 +145,19 @@ class IntegrationRegistry:
 
     def __init__(self):
         self._integrations: Dict[str, BaseIntegration] = {}
-        self._integration_classes: Dict[str, type] = {}
+        # name -> factory returning the integration class
+        self._integration_classes: Dict[str, Callable[[], type]] = {}
+        # Example phrases of all integrations, rebuilt lazily after changes
+        self._automaton: Optional[ahocorasick.Automaton] = None
+        self._automaton_stale = True
 
     def register_class(self, name: str, integration_class: type):
         """Register an integration class (not instance)."""
-        self._integration_classes[name] = integration_class
+        self.register_factory(name, lambda: integration_class)
+
+    def register_factory(self, name: str, factory: Callable[[], type]):
+        """Register a factory returning the integration class, called on first create."""
+        self._integration_classes[name] = factory
         logger.info(f"Registered integration class: {name}")
 
     def create_integration(self, name: str, **kwargs) -> Optional[BaseIntegration]:
@@ -137,10 +166,38 @@ class IntegrationRegistry:
             logger.warning(f"Unknown integration: {name}")
             return None
 
-        instance = self._integration_classes[name](**kwargs)
+        try:
+            integration_class = self._integration_classes[name]()
+        except ImportError as e:
+            logger.warning(f"Integration {name} unavailable: {e}")
+            return None
+
+        instance = integration_class(**kwargs)
         self._integrations[name] = instance
+        self.invalidate_phrases()
         return instance
 
+    def invalidate_phrases(self):
+        """Rebuild the phrase index on next lookup; call after changing capabilities."""
+        self._automaton_stale = True
+
+    def _build_automaton(self) -> Optional[ahocorasick.Automaton]:
+        """Aho-Corasick automaton over example phrases -> [(integration, capability index, capability)]."""
+        phrases: Dict[str, list] = {}
+        for name, integ in self._integrations.items():
+            for index, cap in enumerate(integ.capabilities):
+                for example in cap._example_phrases_lc:
+                    if example:
+                        phrases.setdefault(example, []).append((name, index, cap.name))
+
+        if not phrases:
+            return None
+        automaton = ahocorasick.Automaton()
+        for phrase, entries in phrases.items():
+            automaton.add_word(phrase, entries)
+        automaton.make_automaton()
+        return automaton
+
     def get(self, name: str) -> Optional[BaseIntegration]:
         """Get an integration by name."""
         return self._integrations.get(name)
@@ -167,11 +224,31 @@ class IntegrationRegistry:
         Returns:
             List of (integration_name, capability_name, params)
         """
+        if self._automaton_stale:
+            self._automaton = self._build_automaton()
+            self._automaton_stale = False
+
+        phrase_lc = phrase.lower()
+
+        # First capability (in declaration order) matched per integration
+        best: Dict[str, tuple] = {}
+        if self._automaton is not None:
+            for _, entries in self._automaton.iter(phrase_lc):
+                for name, index, cap_name in entries:
+                    if name not in best or index < best[name][0]:
+                        best[name] = (index, cap_name)
+
         matches = []
         for name, integ in self._integrations.items():
             if not integ.is_connected:
                 continue
-            match = integ.matches_phrase(phrase)
+            if type(integ).matches_phrase is not BaseIntegration.matches_phrase:
+                # Custom matching (e.g. with parameter extraction) stays per integration
+                match = integ.matches_phrase(phrase)
+            elif name in best:
+                match = (best[name][1], {})
+            else:
+                match = None
             if match:
                 cap_name, params = match
                 matches.append((name, cap_name, params))
@@ -190,19 +267,18 @@ def get_integration_registry() -> IntegrationRegistry:
     return _registry
 
 
-def _register_builtin_integrations(registry: IntegrationRegistry):
-    """Register built-in integrations."""
-    try:
-        from .home_assistant import HomeAssistantIntegration
-        registry.register_class("home_assistant", HomeAssistantIntegration)
-    except ImportError:
-        pass
+def _lazy_class(module: str, class_name: str) -> Callable[[], type]:
+    """Factory that imports an integration class the first time it is called."""
+    @cache
+    def factory() -> type:
+        return getattr(import_module(module, __package__), class_name)
+    return factory
 
-    try:
-        from .mqtt import MQTTIntegration
-        registry.register_class("mqtt", MQTTIntegration)
-    except ImportError:
-        pass
+
+def _register_builtin_integrations(registry: IntegrationRegistry):
+    """Register built-in integrations; their modules load on first use."""
+    registry.register_factory("home_assistant", _lazy_class(".home_assistant", "HomeAssistantIntegration"))
+    registry.register_factory("mqtt", _lazy_class(".mqtt", "MQTTIntegration"))
 
     # Future integrations:
     # from .alexa import AlexaIntegration
@@ -211,52 +287,381 @@ def _register_builtin_integrations(registry: IntegrationRegistry):
 
 # ============== Network Discovery ==============
 
-async def discover_network_devices(timeout: int = 5) -> List[DiscoveredDevice]:
+SSDP_ADDR = ("239.255.255.250", 1900)
+SSDP_MX = 2  # seconds devices may wait before answering an M-SEARCH
+
+SSDP_SEARCH = (
+    "M-SEARCH * HTTP/1.1\r\n"
+    "HOST: 239.255.255.250:1900\r\n"
+    'MAN: "ssdp:discover"\r\n'
+    f"MX: {SSDP_MX}\r\n"
+    "ST: ssdp:all\r\n"
+    "\r\n"
+).encode()
+
+# UPnP device type fragment -> (device_type, integration_hint)
+UPNP_DEVICE_TYPES = {
+    "MediaRenderer": ("media_renderer", "Media player - can play audio and video"),
+    "MediaServer": ("media_server", "Media server - shares music and video"),
+    "InternetGatewayDevice": ("router", ""),
+    "DigitalSecurityCamera": ("camera", ""),
+    "Printer": ("printer", ""),
+}
+
+
+MDNS_BROWSE_TIME = 1.5  # seconds to collect mDNS announcements
+
+# mDNS service type -> (device_type, integration_hint)
+MDNS_SERVICE_TYPES = {
+    "_home-assistant._tcp.local.": ("home_assistant", "Home Assistant detected! Can control smart home devices."),
+    "_hap._tcp.local.": ("homekit_device", "HomeKit accessory"),
+    "_googlecast._tcp.local.": ("chromecast", "Google Cast device - can play audio and video"),
+    "_mqtt._tcp.local.": ("mqtt_broker", "MQTT broker - IoT device hub"),
+    "_esphomelib._tcp.local.": ("esphome_device", "ESPHome device"),
+    "_printer._tcp.local.": ("printer", ""),
+}
+
+# Device types that more specific discovery results may replace
+GENERIC_DEVICE_TYPES = {"unknown", "upnp_device", "web_device"}
+
+
+ARP_SETTLE_TIME = 1.0  # seconds for ARP replies to land after the UDP probes
+
+ARP_ENTRY_RE = re.compile(
+    r"(\d+\.\d+\.\d+\.\d+)\)?\s+(?:at\s+)?([0-9a-fA-F]{1,2}(?:[:-][0-9a-fA-F]{1,2}){5})"
+)
+
+# First three MAC bytes -> vendor, for vendors common on home networks
+OUI_VENDORS = {
+    "B8:27:EB": "Raspberry Pi", "DC:A6:32": "Raspberry Pi", "E4:5F:01": "Raspberry Pi",
+    "D8:3A:DD": "Raspberry Pi", "2C:CF:67": "Raspberry Pi",
+    "18:FE:34": "Espressif", "24:0A:C4": "Espressif", "24:6F:28": "Espressif",
+    "30:AE:A4": "Espressif", "3C:71:BF": "Espressif", "5C:CF:7F": "Espressif",
+    "60:01:94": "Espressif", "84:F3:EB": "Espressif", "8C:AA:B5": "Espressif",
+    "A4:CF:12": "Espressif", "BC:DD:C2": "Espressif", "CC:50:E3": "Espressif",
+    "EC:FA:BC": "Espressif",
+    "00:17:88": "Philips Hue", "EC:B5:FA": "Philips Hue",
+    "00:0E:58": "Sonos", "48:A6:B8": "Sonos", "54:2A:1B": "Sonos",
+    "5C:AA:FD": "Sonos", "94:9F:3E": "Sonos", "B8:E9:37": "Sonos",
+    "3C:5A:B4": "Google", "54:60:09": "Google", "F4:F5:D8": "Google",
+    "18:B4:30": "Nest", "64:16:66": "Nest",
+    "44:65:0D": "Amazon", "68:54:FD": "Amazon", "74:C2:46": "Amazon",
+    "F0:27:2D": "Amazon", "FC:65:DE": "Amazon",
+    "00:1C:B3": "Apple", "AC:BC:32": "Apple", "F0:18:98": "Apple",
+    "50:C7:BF": "TP-Link", "98:DA:C4": "TP-Link",
+    "28:6C:07": "Xiaomi", "64:09:80": "Xiaomi", "7C:49:EB": "Xiaomi",
+    "24:A4:3C": "Ubiquiti", "78:8A:20": "Ubiquiti", "80:2A:A8": "Ubiquiti",
+    "F0:9F:C2": "Ubiquiti", "FC:EC:DA": "Ubiquiti",
+    "00:11:32": "Synology",
+}
+
+
+def _normalize_mac(mac: str) -> str:
+    """Upper-case, colon-separated, zero-padded MAC (macOS arp drops leading zeros)."""
+    return ":".join(part.zfill(2) for part in re.split(r"[:-]", mac)).upper()
+
+
+def _lookup_oui(mac: str) -> str:
+    """Vendor for a normalized MAC address, or empty if unknown."""
+    return OUI_VENDORS.get(mac[:8], "")
+
+
+class _SSDPProtocol(asyncio.DatagramProtocol):
+    """Collects SSDP responses, keeping the headers of the first one per IP."""
+
+    def __init__(self):
+        self.responses: Dict[str, Dict[str, str]] = {}
+
+    def datagram_received(self, data: bytes, addr):
+        ip = addr[0]
+        if ip in self.responses:
+            return
+        headers = {}
+        for line in data.decode("utf-8", "replace").split("\r\n")[1:]:
+            key, sep, value = line.partition(":")
+            if sep:
+                headers[key.strip().lower()] = value.strip()
+        self.responses[ip] = headers
+
+
+async def _fetch_device_description(location: str) -> Dict[str, str]:
+    """Fetch a UPnP device description and pick out the interesting fields."""
+    import aiohttp
+
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2)) as session:
+            async with session.get(location) as resp:
+                if resp.status != 200:
+                    return {}
+                root = ET.fromstring(await resp.read())
+    except Exception:
+        return {}
+
+    # Descriptions are namespaced, so match on any namespace
+    info = {}
+    for tag in ("deviceType", "friendlyName", "manufacturer", "modelName"):
+        element = root.find(f".//{{*}}{tag}")
+        if element is not None and element.text:
+            info[tag] = element.text.strip()
+    return info
+
+
+def _ssdp_device(ip: str, headers: Dict[str, str], info: Dict[str, str]) -> DiscoveredDevice:
+    """Build a DiscoveredDevice from an SSDP response and its device description."""
+    device_type = "upnp_device"
+    integration_hint = ""
+
+    upnp_type = info.get("deviceType", "") or headers.get("st", "")
+    for fragment, (mapped_type, hint) in UPNP_DEVICE_TYPES.items():
+        if fragment in upnp_type:
+            device_type, integration_hint = mapped_type, hint
+            break
+
+    server = headers.get("server", "").lower()
+    manufacturer = info.get("manufacturer", "")
+    if "homeassistant" in server or "home assistant" in manufacturer.lower():
+        device_type = "home_assistant"
+        integration_hint = "Home Assistant detected! Can control smart home devices."
+
+    return DiscoveredDevice(
+        ip=ip,
+        hostname=info.get("friendlyName") or info.get("modelName") or ip,
+        device_type=device_type,
+        manufacturer=manufacturer,
+        integration_hint=integration_hint
+    )
+
+
+async def _ssdp_discover(timeout: float) -> List[DiscoveredDevice]:
     """
-    Scan local network for devices.
+    Find UPnP devices with a single SSDP M-SEARCH multicast.
 
-    Uses ARP scan and common port checks to identify devices.
+    Responses are unicast back to our socket, so no multicast group
+    membership is needed; we listen for MX + 0.5 seconds at most.
     """
-    import asyncio
-    import socket
+    loop = asyncio.get_running_loop()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+    sock.bind(("", 0))
+
+    try:
+        transport, protocol = await loop.create_datagram_endpoint(_SSDPProtocol, sock=sock)
+    except Exception as e:
+        sock.close()
+        logger.warning(f"SSDP discovery unavailable: {e}")
+        return []
+
+    try:
+        transport.sendto(SSDP_SEARCH, SSDP_ADDR)
+        await asyncio.sleep(min(timeout, SSDP_MX + 0.5))
+    finally:
+        transport.close()
+
+    responses = protocol.responses
+    descriptions = await asyncio.gather(*(
+        _fetch_device_description(headers["location"]) if "location" in headers
+        else asyncio.sleep(0, result={})
+        for headers in responses.values()
+    ))
+
+    return [
+        _ssdp_device(ip, headers, info)
+        for (ip, headers), info in zip(responses.items(), descriptions)
+    ]
+
+
+async def _mdns_discover(timeout: float) -> List[DiscoveredDevice]:
+    """Browse mDNS for the service types EVA knows how to use."""
+    if not ZEROCONF_AVAILABLE:
+        return []
+
+    found = []
+
+    def on_service_state_change(zeroconf, service_type, name, state_change):
+        if state_change is ServiceStateChange.Added:
+            found.append((service_type, name))
+
+    try:
+        aiozc = AsyncZeroconf()
+    except Exception as e:
+        logger.warning(f"mDNS discovery unavailable: {e}")
+        return []
+
+    try:
+        browser = AsyncServiceBrowser(
+            aiozc.zeroconf, list(MDNS_SERVICE_TYPES), handlers=[on_service_state_change]
+        )
+        await asyncio.sleep(min(timeout, MDNS_BROWSE_TIME))
+        await browser.async_cancel()
+
+        infos = [AsyncServiceInfo(service_type, name) for service_type, name in found]
+        await asyncio.gather(*(info.async_request(aiozc.zeroconf, 1000) for info in infos))
+    except Exception as e:
+        logger.warning(f"mDNS discovery failed: {e}")
+        return []
+    finally:
+        await aiozc.async_close()
 
     devices = []
+    for info in infos:
+        device_type, integration_hint = MDNS_SERVICE_TYPES[info.type]
+        hostname = (info.server or info.name).rstrip(".")
+        for ip in info.parsed_addresses():
+            if ":" in ip:
+                continue  # The network scan is IPv4 only
+            devices.append(DiscoveredDevice(
+                ip=ip,
+                hostname=hostname,
+                device_type=device_type,
+                open_ports=[info.port] if info.port else [],
+                integration_hint=integration_hint
+            ))
+    return devices
 
-    # Get local network range
+
+def _merge_devices(devices: Dict[str, DiscoveredDevice], found: List[DiscoveredDevice]):
+    """Add found devices by IP, filling gaps in devices already known."""
+    for device in found:
+        known = devices.get(device.ip)
+        if known is None:
+            devices[device.ip] = device
+            continue
+
+        if known.hostname == known.ip:
+            known.hostname = device.hostname
+        if known.device_type in GENERIC_DEVICE_TYPES and device.device_type not in GENERIC_DEVICE_TYPES:
+            known.device_type = device.device_type
+            known.integration_hint = device.integration_hint
+        known.manufacturer = known.manufacturer or device.manufacturer
+        known.mac = known.mac or device.mac
+        known.open_ports.extend(p for p in device.open_ports if p not in known.open_ports)
+
+
+def _populate_arp_cache(network_prefix: str):
+    """Make the kernel resolve every /24 address by sending each a UDP datagram."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
     try:
-        hostname = socket.gethostname()
-        local_ip = socket.gethostbyname(hostname)
-        network_prefix = ".".join(local_ip.split(".")[:-1])
-    except Exception:
-        network_prefix = "192.168.1"
+        for i in range(1, 255):
+            try:
+                sock.sendto(b"", (f"{network_prefix}.{i}", 9))  # discard port
+            except OSError:
+                pass
+    finally:
+        sock.close()
 
-    logger.info(f"Scanning network: {network_prefix}.0/24")
+
+async def _read_arp_table(network_prefix: str) -> Dict[str, str]:
+    """Map IP -> MAC for resolved neighbours on the /24, from the system ARP cache."""
+    try:
+        with open("/proc/net/arp") as f:
+            lines = f.read().splitlines()[1:]
+        # Columns: IP address, HW type, Flags, HW address, Mask, Device
+        entries = [line.split() for line in lines]
+        table = {e[0]: e[3] for e in entries if len(e) >= 4 and e[2] != "0x0"}
+    except OSError:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "arp", "-an",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            output, _ = await proc.communicate()
+        except OSError:
+            return {}
+        table = dict(ARP_ENTRY_RE.findall(output.decode("utf-8", "replace")))
+
+    prefix = f"{network_prefix}."
+    neighbours = {ip: _normalize_mac(mac) for ip, mac in table.items() if ip.startswith(prefix)}
+    return {
+        ip: mac for ip, mac in neighbours.items()
+        if mac not in ("00:00:00:00:00:00", "FF:FF:FF:FF:FF:FF")
+    }
+
+
+async def _arp_discover(network_prefix: str) -> List[DiscoveredDevice]:
+    """List live hosts on the /24 from the ARP cache, after probing to fill it."""
+    _populate_arp_cache(network_prefix)
+    await asyncio.sleep(ARP_SETTLE_TIME)
+
+    return [
+        DiscoveredDevice(ip=ip, hostname=ip, mac=mac, manufacturer=_lookup_oui(mac))
+        for ip, mac in (await _read_arp_table(network_prefix)).items()
+    ]
+
+
+TCP_PROBE_PORTS = (80, 443, 8080, 8123, 1883, 5353)  # HTTP, HTTPS, alt-HTTP, Home Assistant, MQTT, mDNS
+TCP_PROBE_TIMEOUT = 0.5
+MAX_CONCURRENT_HOSTS = 64  # bounds open sockets to 64 x len(TCP_PROBE_PORTS)
+
+
+async def _probe_port(ip: str, port: int) -> bool:
+    """Check whether a TCP port accepts connections, using a bare socket."""
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout=TCP_PROBE_TIMEOUT)
+        return True
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        sock.close()
+
+
+async def _probe_host_ports(ip: str) -> List[int]:
+    """
+    Probe TCP_PROBE_PORTS at once, stopping as soon as the device type is settled.
+
+    Home Assistant (8123) decides the type outright and MQTT (1883) does
+    once 8123 is known to be closed, so the remaining probes are cancelled.
+    """
+    tasks = {asyncio.create_task(_probe_port(ip, port)): port for port in TCP_PROBE_PORTS}
+    pending = set(tasks)
+    open_ports, closed_ports = set(), set()
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result():
+                    open_ports.add(tasks[task])
+                else:
+                    closed_ports.add(tasks[task])
+
+            if 8123 in open_ports or (1883 in open_ports and 8123 in closed_ports):
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        # Let cancelled probes close their sockets
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    return [port for port in TCP_PROBE_PORTS if port in open_ports]
+
+
+async def _tcp_sweep(
+    ips: Iterable[str],
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> List[DiscoveredDevice]:
+    """Probe common ports on the given addresses, reporting (checked, total) hosts."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_HOSTS)
 
     async def check_host(ip: str) -> Optional[DiscoveredDevice]:
         """Check if a host is alive and gather info."""
         try:
-            # Try to connect to common ports
-            ports_to_check = [80, 443, 8080, 8123, 1883, 5353]  # HTTP, HTTPS, alt-HTTP, Home Assistant, MQTT, mDNS
-            open_ports = []
-
-            for port in ports_to_check:
-                try:
-                    reader, writer = await asyncio.wait_for(
-                        asyncio.open_connection(ip, port),
-                        timeout=0.5
-                    )
-                    open_ports.append(port)
-                    writer.close()
-                    await writer.wait_closed()
-                except Exception:
-                    pass
+            async with semaphore:
+                open_ports = await _probe_host_ports(ip)
 
             if not open_ports:
                 return None
 
-            # Try to get hostname
+            # Try to get hostname (the lookup blocks, so keep it off the loop)
             try:
-                hostname = socket.gethostbyaddr(ip)[0]
+                hostname = (await asyncio.get_running_loop().run_in_executor(
+                    None, socket.gethostbyaddr, ip
+                ))[0]
             except Exception:
                 hostname = ip
 
@@ -288,14 +693,80 @@ async def discover_network_devices(timeout: int = 5) -> List[DiscoveredDevice]:
         except Exception:
             return None
 
-    # Scan in parallel
-    tasks = [check_host(f"{network_prefix}.{i}") for i in range(1, 255)]
-    results = await asyncio.gather(*tasks)
+    # Scan in parallel, collecting hosts as they finish
+    checks = [check_host(ip) for ip in ips]
+    devices = []
+    for checked, check in enumerate(asyncio.as_completed(checks), 1):
+        device = await check
+        if device is not None:
+            devices.append(device)
+        if on_progress:
+            on_progress(checked, len(checks))
+    return devices
+
+
+SCAN_CACHE_TTL = 30  # seconds a network scan result is reused
+
+# network_prefix -> (monotonic scan time, devices found)
+_scan_cache: Dict[str, tuple] = {}
+
+
+async def discover_network_devices(
+    timeout: int = 5,
+    force: bool = False,
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> List[DiscoveredDevice]:
+    """
+    Scan local network for devices.
+
+    Uses SSDP and mDNS to find devices that announce themselves and the
+    ARP cache to find the rest, then common port checks to identify live
+    hosts nothing else recognized. Results are reused for SCAN_CACHE_TTL
+    seconds unless force is set. on_progress(checked, total) is called as
+    each port-checked host finishes.
+    """
+    # Get local network range
+    try:
+        hostname = socket.gethostname()
+        local_ip = socket.gethostbyname(hostname)
+        network_prefix = ".".join(local_ip.split(".")[:-1])
+    except Exception:
+        network_prefix = "192.168.1"
+
+    cached = _scan_cache.get(network_prefix)
+    if not force and cached and time.monotonic() - cached[0] < SCAN_CACHE_TTL:
+        return list(cached[1])
 
-    devices = [d for d in results if d is not None]
+    logger.info(f"Scanning network: {network_prefix}.0/24")
+
+    # SSDP, mDNS and the ARP cache are cheap, so run them together first
+    ssdp_devices, mdns_devices, arp_devices = await asyncio.gather(
+        _ssdp_discover(timeout), _mdns_discover(timeout), _arp_discover(network_prefix)
+    )
+    logger.info(
+        f"SSDP found {len(ssdp_devices)} devices, mDNS {len(mdns_devices)}, ARP {len(arp_devices)}"
+    )
+
+    devices: Dict[str, DiscoveredDevice] = {}
+    _merge_devices(devices, ssdp_devices)
+    _merge_devices(devices, mdns_devices)
+    _merge_devices(devices, arp_devices)
+
+    # Port checks only for live hosts nothing has identified yet; without
+    # an ARP table fall back to checking the whole /24
+    if arp_devices:
+        unidentified = [ip for ip, d in devices.items() if d.device_type in GENERIC_DEVICE_TYPES]
+    else:
+        unidentified = [
+            ip for ip in (f"{network_prefix}.{i}" for i in range(1, 255))
+            if ip not in devices
+        ]
+    _merge_devices(devices, await _tcp_sweep(unidentified, on_progress))
     logger.info(f"Found {len(devices)} devices on network")
 
-    return devices
+    found = list(devices.values())
+    _scan_cache[network_prefix] = (time.monotonic(), found)
+    return list(found)
 
 
 # ============== Dynamic Integration Loader ==============
@@ -306,13 +777,21 @@ async def suggest_integrations(devices: List[DiscoveredDevice]) -> List[Dict[str
 
     Returns list of suggestions with setup instructions.
     """
+    key = tuple((d.ip, d.hostname, d.device_type) for d in devices)
+    # Copies, so callers can't modify the cached suggestions (including nested setup)
+    return deepcopy(list(_suggestions_for(key)))
+
+
+@lru_cache(maxsize=32)
+def _suggestions_for(devices: tuple) -> tuple:
+    """Suggestions for (ip, hostname, device_type) tuples."""
     suggestions = []
 
-    for device in devices:
-        if device.device_type == "home_assistant":
+    for ip, hostname, device_type in devices:
+        if device_type == "home_assistant":
             suggestions.append({
-                "device": device.hostname,
-                "ip": device.ip,
+                "device": hostname,
+                "ip": ip,
                 "integration": "home_assistant",
                 "name": "Home Assistant",
                 "description": "Control all your smart home devices through Home Assistant",
@@ -327,10 +806,10 @@ async def suggest_integrations(devices: List[DiscoveredDevice]) -> List[Dict[str
                 "capabilities": ["turn_on", "turn_off", "set_brightness", "set_temperature"]
             })
 
-        elif device.device_type == "mqtt_broker":
+        elif device_type == "mqtt_broker":
             suggestions.append({
-                "device": device.hostname,
-                "ip": device.ip,
+                "device": hostname,
+                "ip": ip,
                 "integration": "mqtt",
                 "name": "MQTT Devices",
                 "description": "Connect to IoT devices via MQTT",
@@ -341,4 +820,4 @@ async def suggest_integrations(devices: List[DiscoveredDevice]) -> List[Dict[str
                 "capabilities": ["publish", "subscribe", "device_control"]
             })
 
-    return suggestions
+    return tuple(suggestions)
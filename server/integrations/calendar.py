@@ -1,20 +1,42 @@
 """Google Calendar integration for EVA."""
 
 import os
-import json
+import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
+
+import orjson
+
+# The Google SDK is slow to import, so it is loaded on first use
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
 
 logger = logging.getLogger("eva.calendar")
 
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly',
           'https://www.googleapis.com/auth/calendar.events']
 
+# googleapiclient is blocking, so API calls run on these threads
+_calendar_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="eva-gcal")
+
+# httplib2 connections are not thread-safe, so each worker gets its own
+_thread_local = threading.local()
+
+EVENTS_CACHE_TTL = 60  # seconds fetched event lists are reused
+AUTH_RECHECK_INTERVAL = 60  # seconds a positive credentials check is trusted
+EXPIRY_MARGIN = 300  # google-auth treats tokens as expired a few minutes early
+
+_DAY_NAMES = ('Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс')
+
+
+def _event_start(event: Dict[str, Any]) -> datetime:
+    """Start of a parsed event; start_datetime is our own isoformat() output."""
+    return datetime.fromisoformat(event.get("start_datetime") or event["start"])
+
 
 class GoogleCalendarIntegration:
     """Google Calendar integration."""
@@ -23,33 +45,97 @@ class GoogleCalendarIntegration:
         self.data_dir = data_dir
         self.credentials_file = os.path.join(data_dir, "calendar_credentials.json")
         self.token_file = os.path.join(data_dir, "calendar_token.json")
-        self.credentials: Optional[Credentials] = None
+        self.credentials: Optional["Credentials"] = None
         self.service = None
         self.oauth_config: Dict[str, str] = {}
+        # Access token self.service was built for, and (oauth key, client config)
+        self._service_token: Optional[str] = None
+        self._flow_config_cache: Optional[tuple] = None
+        # ("today",) / ("upcoming", days, max_results) -> (monotonic time, result)
+        self._events_cache: Dict[tuple, tuple] = {}
+        # (events_data, text) of the last format_events call
+        self._formatted: Optional[tuple] = None
+        # time.time() until which is_authenticated may skip credentials.valid
+        self._valid_until = 0.0
         self._load_token()
 
     def _load_token(self):
         """Load saved token if exists."""
         if os.path.exists(self.token_file):
             try:
-                with open(self.token_file, 'r') as f:
-                    token_data = json.load(f)
+                from google.oauth2.credentials import Credentials
+
+                with open(self.token_file, 'rb') as f:
+                    token_data = orjson.loads(f.read())
                     self.credentials = Credentials.from_authorized_user_info(token_data, SCOPES)
                     if self.credentials and self.credentials.valid:
-                        self.service = build('calendar', 'v3', credentials=self.credentials)
+                        self._build_service()
                         logger.info("Calendar credentials loaded")
             except Exception as e:
                 logger.error(f"Failed to load calendar token: {e}")
 
     def _save_token(self):
         """Save token for future use."""
+        self._valid_until = 0.0
         if self.credentials:
+            # to_json() is already serialized, so write it as is
             with open(self.token_file, 'w') as f:
                 f.write(self.credentials.to_json())
 
+    def _build_service(self):
+        """Build the Calendar client, reusing it while the access token is unchanged."""
+        if self.service is not None and self._service_token == self.credentials.token:
+            return self.service
+
+        from googleapiclient.discovery import build
+
+        # The discovery document bundled with the library avoids a fetch per build
+        self.service = build(
+            'calendar', 'v3',
+            credentials=self.credentials,
+            static_discovery=True,
+            cache_discovery=False
+        )
+        self._service_token = self.credentials.token
+        return self.service
+
+    def _flow_config(self) -> Dict[str, Any]:
+        """OAuth client config for Flow, rebuilt only when oauth_config changes."""
+        key = (
+            self.oauth_config["client_id"],
+            self.oauth_config["client_secret"],
+            self.oauth_config["redirect_uri"]
+        )
+        if self._flow_config_cache is None or self._flow_config_cache[0] != key:
+            self._flow_config_cache = (key, {
+                "web": {
+                    "client_id": self.oauth_config["client_id"],
+                    "client_secret": self.oauth_config["client_secret"],
+                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                    "token_uri": "https://oauth2.googleapis.com/token",
+                    "redirect_uris": [self.oauth_config["redirect_uri"]]
+                }
+            })
+        return self._flow_config_cache[1]
+
     @property
     def is_authenticated(self) -> bool:
-        return self.credentials is not None and self.credentials.valid
+        if self.credentials is None:
+            return False
+        now = time.time()
+        if now < self._valid_until:
+            return True
+        if not self.credentials.valid:
+            return False
+
+        # expiry is a naive UTC datetime, or None for tokens that don't expire
+        expiry = self.credentials.expiry
+        expires_at = (
+            expiry.replace(tzinfo=timezone.utc).timestamp() - EXPIRY_MARGIN
+            if expiry else float("inf")
+        )
+        self._valid_until = min(now + AUTH_RECHECK_INTERVAL, expires_at)
+        return True
 
     def configure_oauth(self, client_id: str, client_secret: str, redirect_uri: str):
         """Configure OAuth settings."""
@@ -75,16 +161,10 @@ class GoogleCalendarIntegration:
         if not self.oauth_config.get("client_id"):
             raise ValueError("OAuth not configured")
 
+        from google_auth_oauthlib.flow import Flow
+
         flow = Flow.from_client_config(
-            {
-                "web": {
-                    "client_id": self.oauth_config["client_id"],
-                    "client_secret": self.oauth_config["client_secret"],
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "redirect_uris": [self.oauth_config["redirect_uri"]]
-                }
-            },
+            self._flow_config(),
             scopes=SCOPES,
             redirect_uri=self.oauth_config["redirect_uri"]
         )
@@ -104,16 +184,10 @@ class GoogleCalendarIntegration:
                 vault = get_vault()
                 self.oauth_config = vault.get("calendar_oauth") or {}
 
+            from google_auth_oauthlib.flow import Flow
+
             flow = Flow.from_client_config(
-                {
-                    "web": {
-                        "client_id": self.oauth_config["client_id"],
-                        "client_secret": self.oauth_config["client_secret"],
-                        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                        "token_uri": "https://oauth2.googleapis.com/token",
-                        "redirect_uris": [self.oauth_config["redirect_uri"]]
-                    }
-                },
+                self._flow_config(),
                 scopes=SCOPES,
                 redirect_uri=self.oauth_config["redirect_uri"]
             )
@@ -122,7 +196,7 @@ class GoogleCalendarIntegration:
             self.credentials = flow.credentials
             self._save_token()
 
-            self.service = build('calendar', 'v3', credentials=self.credentials)
+            self._build_service()
             logger.info("Calendar authenticated successfully")
             return True
 
@@ -130,57 +204,137 @@ class GoogleCalendarIntegration:
             logger.error(f"Calendar OAuth failed: {e}")
             return False
 
+    def _upcoming_request(self, days: int, max_results: int):
+        """events().list request for the next `days` days."""
+        now = datetime.utcnow()
+        time_min = now.isoformat() + 'Z'
+        time_max = (now + timedelta(days=days)).isoformat() + 'Z'
+
+        return self.service.events().list(
+            calendarId='primary',
+            timeMin=time_min,
+            timeMax=time_max,
+            maxResults=max_results,
+            singleEvents=True,
+            orderBy='startTime'
+        )
+
+    def _today_request(self):
+        """events().list request for today."""
+        now = datetime.utcnow()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        today_end = today_start + timedelta(days=1)
+
+        return self.service.events().list(
+            calendarId='primary',
+            timeMin=today_start.isoformat() + 'Z',
+            timeMax=today_end.isoformat() + 'Z',
+            singleEvents=True,
+            orderBy='startTime'
+        )
+
+    def _thread_http(self):
+        """Authorized HTTP client for the current worker thread."""
+        http = getattr(_thread_local, "http", None)
+        if http is None or http.credentials is not self.credentials:
+            import google_auth_httplib2
+            import httplib2
+
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http())
+            _thread_local.http = http
+        return http
+
+    async def _execute(self, request) -> Any:
+        """Run a request (or batch) on the calendar executor."""
+        return await asyncio.get_running_loop().run_in_executor(
+            _calendar_executor, lambda: request.execute(http=self._thread_http())
+        )
+
+    @staticmethod
+    def _parse_upcoming(events_result: Dict[str, Any]) -> Dict[str, Any]:
+        events = events_result.get('items', [])
+
+        parsed_events = []
+        for event in events:
+            start = event['start'].get('dateTime', event['start'].get('date'))
+            end = event['end'].get('dateTime', event['end'].get('date'))
+
+            # fromisoformat reads both RFC 3339 times (with Z) and all-day dates
+            start_dt = datetime.fromisoformat(start)
+            is_all_day = 'T' not in start
+
+            parsed_events.append({
+                "id": event['id'],
+                "summary": event.get('summary', 'No title'),
+                "description": event.get('description', ''),
+                "start": start,
+                "end": end,
+                "start_datetime": start_dt.isoformat(),
+                "is_all_day": is_all_day,
+                "location": event.get('location', ''),
+                "link": event.get('htmlLink', '')
+            })
+
+        return {
+            "success": True,
+            "events": parsed_events,
+            "count": len(parsed_events)
+        }
+
+    @staticmethod
+    def _parse_today(events_result: Dict[str, Any]) -> Dict[str, Any]:
+        events = events_result.get('items', [])
+
+        parsed = []
+        for event in events:
+            start = event['start'].get('dateTime', event['start'].get('date'))
+            if 'T' in start:
+                time_str = datetime.fromisoformat(start).strftime('%H:%M')
+            else:
+                time_str = "весь день"
+
+            parsed.append({
+                "summary": event.get('summary', 'Без названия'),
+                "time": time_str,
+                "location": event.get('location', '')
+            })
+
+        return {
+            "success": True,
+            "events": parsed,
+            "count": len(parsed)
+        }
+
+    def _cached_events(self, key: tuple) -> Optional[Dict[str, Any]]:
+        entry = self._events_cache.get(key)
+        if entry and time.monotonic() - entry[0] < EVENTS_CACHE_TTL:
+            return entry[1]
+        return None
+
+    def _cache_events(self, key: tuple, result: Dict[str, Any]):
+        now = time.monotonic()
+        # Drop expired entries so arbitrary days/limit values don't pile up
+        self._events_cache = {
+            k: v for k, v in self._events_cache.items() if now - v[0] < EVENTS_CACHE_TTL
+        }
+        self._events_cache[key] = (now, result)
+
     async def get_upcoming_events(self, days: int = 7, max_results: int = 10) -> Dict[str, Any]:
         """Get upcoming calendar events."""
         if not self.is_authenticated:
             return {"success": False, "error": "Not authenticated"}
 
-        try:
-            now = datetime.utcnow()
-            time_min = now.isoformat() + 'Z'
-            time_max = (now + timedelta(days=days)).isoformat() + 'Z'
+        key = ("upcoming", days, max_results)
+        cached = self._cached_events(key)
+        if cached is not None:
+            return cached
 
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=time_min,
-                timeMax=time_max,
-                maxResults=max_results,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-
-            events = events_result.get('items', [])
-
-            parsed_events = []
-            for event in events:
-                start = event['start'].get('dateTime', event['start'].get('date'))
-                end = event['end'].get('dateTime', event['end'].get('date'))
-
-                # Parse datetime
-                if 'T' in start:
-                    start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
-                    is_all_day = False
-                else:
-                    start_dt = datetime.strptime(start, '%Y-%m-%d')
-                    is_all_day = True
-
-                parsed_events.append({
-                    "id": event['id'],
-                    "summary": event.get('summary', 'No title'),
-                    "description": event.get('description', ''),
-                    "start": start,
-                    "end": end,
-                    "start_datetime": start_dt.isoformat(),
-                    "is_all_day": is_all_day,
-                    "location": event.get('location', ''),
-                    "link": event.get('htmlLink', '')
-                })
+        from googleapiclient.errors import HttpError
 
-            return {
-                "success": True,
-                "events": parsed_events,
-                "count": len(parsed_events)
-            }
+        try:
+            result = self._parse_upcoming(await self._execute(self._upcoming_request(days, max_results)))
+            self._cache_events(key, result)
+            return result
 
         except HttpError as e:
             logger.error(f"Calendar API error: {e}")
@@ -191,45 +345,82 @@ class GoogleCalendarIntegration:
         if not self.is_authenticated:
             return {"success": False, "error": "Not authenticated"}
 
-        try:
-            now = datetime.utcnow()
-            today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            today_end = today_start + timedelta(days=1)
-
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=today_start.isoformat() + 'Z',
-                timeMax=today_end.isoformat() + 'Z',
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-
-            events = events_result.get('items', [])
-
-            parsed = []
-            for event in events:
-                start = event['start'].get('dateTime', event['start'].get('date'))
-                if 'T' in start:
-                    start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
-                    time_str = start_dt.strftime('%H:%M')
-                else:
-                    time_str = "весь день"
+        cached = self._cached_events(("today",))
+        if cached is not None:
+            return cached
 
-                parsed.append({
-                    "summary": event.get('summary', 'Без названия'),
-                    "time": time_str,
-                    "location": event.get('location', '')
-                })
+        from googleapiclient.errors import HttpError
 
-            return {
-                "success": True,
-                "events": parsed,
-                "count": len(parsed)
-            }
+        try:
+            result = self._parse_today(await self._execute(self._today_request()))
+            self._cache_events(("today",), result)
+            return result
 
         except HttpError as e:
             return {"success": False, "error": str(e)}
 
+    async def get_dashboard(self, days: int = 7, max_results: int = 10) -> Dict[str, Any]:
+        """
+        Get today's and upcoming events in one batched API round-trip.
+
+        Returns {"success", "today", "upcoming"} where today and upcoming
+        have the same shape as get_today_events / get_upcoming_events.
+        """
+        if not self.is_authenticated:
+            return {"success": False, "error": "Not authenticated"}
+
+        keys = {"today": ("today",), "upcoming": ("upcoming", days, max_results)}
+        results: Dict[str, Any] = {}
+        for request_id, key in keys.items():
+            cached = self._cached_events(key)
+            if cached is not None:
+                results[request_id] = cached
+
+        if len(results) < len(keys):
+            await self._fetch_dashboard(days, max_results, results)
+
+        dashboard = {
+            "success": all(r["success"] for r in results.values()),
+            "today": results["today"],
+            "upcoming": results["upcoming"]
+        }
+        if not dashboard["success"]:
+            dashboard["error"] = next(r["error"] for r in results.values() if not r["success"])
+        return dashboard
+
+    async def _fetch_dashboard(self, days: int, max_results: int, results: Dict[str, Any]):
+        """Fetch the dashboard lists missing from results in one batch request."""
+        requests = {
+            "today": (("today",), self._parse_today, self._today_request),
+            "upcoming": (
+                ("upcoming", days, max_results),
+                self._parse_upcoming,
+                lambda: self._upcoming_request(days, max_results)
+            ),
+        }
+
+        def on_response(request_id, response, exception):
+            key, parse, _ = requests[request_id]
+            if exception is not None:
+                logger.error(f"Calendar API error: {exception}")
+                results[request_id] = {"success": False, "error": str(exception)}
+            else:
+                results[request_id] = parse(response)
+                self._cache_events(key, results[request_id])
+
+        batch = self.service.new_batch_http_request(callback=on_response)
+        for request_id, (_, _, build_request) in requests.items():
+            if request_id not in results:
+                batch.add(build_request(), request_id=request_id)
+
+        try:
+            await self._execute(batch)
+        except Exception as e:
+            logger.error(f"Calendar batch request failed: {e}")
+            error = {"success": False, "error": str(e)}
+            for request_id in requests:
+                results.setdefault(request_id, error)
+
     async def create_event(
         self,
         summary: str,
@@ -242,6 +433,8 @@ class GoogleCalendarIntegration:
         if not self.is_authenticated:
             return {"success": False, "error": "Not authenticated"}
 
+        from googleapiclient.errors import HttpError
+
         try:
             if end_time is None:
                 end_time = start_time + timedelta(hours=1)
@@ -260,10 +453,11 @@ class GoogleCalendarIntegration:
                 },
             }
 
-            created = self.service.events().insert(
+            created = await self._execute(self.service.events().insert(
                 calendarId='primary',
                 body=event
-            ).execute()
+            ))
+            self._events_cache.clear()
 
             return {
                 "success": True,
@@ -277,6 +471,14 @@ class GoogleCalendarIntegration:
 
     def format_events(self, events_data: Dict[str, Any]) -> str:
         """Format events for voice output."""
+        # Cached event lists are shared objects, so repeat calls hit this
+        if self._formatted is not None and self._formatted[0] is events_data:
+            return self._formatted[1]
+        text = self._format_events(events_data)
+        self._formatted = (events_data, text)
+        return text
+
+    def _format_events(self, events_data: Dict[str, Any]) -> str:
         if not events_data.get("success"):
             return f"Не удалось получить события: {events_data.get('error', 'unknown')}"
 
@@ -285,29 +487,24 @@ class GoogleCalendarIntegration:
             return "У тебя нет запланированных событий."
 
         lines = [f"У тебя {len(events)} событий:"]
+        today = datetime.now().date()
+        tomorrow = today + timedelta(days=1)
 
         # Group by day
         current_day = None
         for event in events:
-            start = event.get("start_datetime") or event.get("start")
-            if 'T' in str(start):
-                dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
-                day = dt.strftime('%Y-%m-%d')
-                time = dt.strftime('%H:%M')
-            else:
-                day = start
-                time = "весь день"
+            dt = _event_start(event)
+            day = dt.date()
+            time = "весь день" if event.get("is_all_day") else dt.strftime('%H:%M')
 
             if day != current_day:
                 current_day = day
-                day_dt = datetime.strptime(day[:10], '%Y-%m-%d')
-                if day_dt.date() == datetime.now().date():
+                if day == today:
                     day_name = "Сегодня"
-                elif day_dt.date() == (datetime.now() + timedelta(days=1)).date():
+                elif day == tomorrow:
                     day_name = "Завтра"
                 else:
-                    day_names = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
-                    day_name = f"{day_names[day_dt.weekday()]}, {day_dt.strftime('%d.%m')}"
+                    day_name = f"{_DAY_NAMES[day.weekday()]}, {day.strftime('%d.%m')}"
                 lines.append(f"\n📅 {day_name}:")
 
             summary = event.get("summary", "Без названия")
@@ -2,10 +2,14 @@
 
 import os
 import json
+import asyncio
 import base64
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta
+from email.header import Header
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
@@ -26,6 +30,12 @@ SCOPES = [
     'https://www.googleapis.com/auth/gmail.labels'
 ]
 
+# Gmail accepts at most this many calls in one batch request
+GMAIL_BATCH_LIMIT = 100
+
+# Refresh access tokens this close to expiry, before a call can fail with 401
+REFRESH_SKEW = timedelta(seconds=60)
+
 
 class GmailIntegration:
     """Handles Gmail OAuth and email operations."""
@@ -34,7 +44,17 @@ class GmailIntegration:
         self.settings = get_settings()
         self.vault = get_vault()
         self._service = None
+        # Credentials object self._service was built with
+        self._service_credentials: Optional[Credentials] = None
         self._credentials: Optional[Credentials] = None
+        # Access token last written to (or read from) the vault
+        self._stored_token: Optional[str] = None
+        # ((client_id, client_secret, redirect_uri), Flow client config)
+        self._flow_config_cache: Optional[tuple] = None
+        # Created on first API call; httplib2 is not thread-safe, so each worker
+        # thread keeps its own authorized connection
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread_local = threading.local()
 
     @property
     def is_configured(self) -> bool:
@@ -60,6 +80,25 @@ class GmailIntegration:
         })
         logger.info("Gmail OAuth configured")
 
+    def _flow_config(self, oauth_creds: Dict[str, Any]) -> Dict[str, Any]:
+        """OAuth client config for Flow, rebuilt only when the OAuth app changes."""
+        key = (
+            oauth_creds["client_id"],
+            oauth_creds["client_secret"],
+            oauth_creds["redirect_uri"]
+        )
+        if self._flow_config_cache is None or self._flow_config_cache[0] != key:
+            self._flow_config_cache = (key, {
+                "web": {
+                    "client_id": oauth_creds["client_id"],
+                    "client_secret": oauth_creds["client_secret"],
+                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                    "token_uri": "https://oauth2.googleapis.com/token",
+                    "redirect_uris": [oauth_creds["redirect_uri"]]
+                }
+            })
+        return self._flow_config_cache[1]
+
     def get_auth_url(self) -> Optional[str]:
         """
         Get OAuth authorization URL.
@@ -70,15 +109,7 @@ class GmailIntegration:
             return None
 
         flow = Flow.from_client_config(
-            {
-                "web": {
-                    "client_id": oauth_creds["client_id"],
-                    "client_secret": oauth_creds["client_secret"],
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "redirect_uris": [oauth_creds["redirect_uri"]]
-                }
-            },
+            self._flow_config(oauth_creds),
             scopes=SCOPES,
             redirect_uri=oauth_creds["redirect_uri"]
         )
@@ -102,15 +133,7 @@ class GmailIntegration:
 
         try:
             flow = Flow.from_client_config(
-                {
-                    "web": {
-                        "client_id": oauth_creds["client_id"],
-                        "client_secret": oauth_creds["client_secret"],
-                        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                        "token_uri": "https://oauth2.googleapis.com/token",
-                        "redirect_uris": [oauth_creds["redirect_uri"]]
-                    }
-                },
+                self._flow_config(oauth_creds),
                 scopes=SCOPES,
                 redirect_uri=oauth_creds["redirect_uri"]
             )
@@ -118,15 +141,7 @@ class GmailIntegration:
             flow.fetch_token(code=code)
             credentials = flow.credentials
 
-            # Store tokens in vault
-            self.vault.store("gmail_tokens", {
-                "access_token": credentials.token,
-                "refresh_token": credentials.refresh_token,
-                "token_uri": credentials.token_uri,
-                "client_id": credentials.client_id,
-                "client_secret": credentials.client_secret,
-                "scopes": list(credentials.scopes) if credentials.scopes else SCOPES
-            })
+            self._store_tokens(credentials)
 
             self._credentials = credentials
             logger.info("Gmail OAuth tokens stored successfully")
@@ -136,165 +151,316 @@ class GmailIntegration:
             logger.error(f"Gmail OAuth callback failed: {e}")
             return False
 
+    def _store_tokens(self, credentials: Credentials):
+        """Save tokens to the vault, with expiry so later loads know when to refresh."""
+        self._stored_token = credentials.token
+        self.vault.store("gmail_tokens", {
+            "access_token": credentials.token,
+            "refresh_token": credentials.refresh_token,
+            "token_uri": credentials.token_uri,
+            "client_id": credentials.client_id,
+            "client_secret": credentials.client_secret,
+            "scopes": list(credentials.scopes) if credentials.scopes else SCOPES,
+            "expiry": credentials.expiry.isoformat() if credentials.expiry else None
+        })
+
+    @staticmethod
+    def _credentials_from(tokens: Dict[str, Any]) -> Credentials:
+        """Build Credentials from the vault's gmail_tokens entry."""
+        return Credentials(
+            token=tokens.get("access_token"),
+            refresh_token=tokens.get("refresh_token"),
+            token_uri=tokens.get("token_uri", "https://oauth2.googleapis.com/token"),
+            client_id=tokens.get("client_id"),
+            client_secret=tokens.get("client_secret"),
+            scopes=tokens.get("scopes", SCOPES),
+            # google-auth compares expiry as naive UTC
+            expiry=datetime.fromisoformat(tokens["expiry"]) if tokens.get("expiry") else None
+        )
+
+    @staticmethod
+    def _needs_refresh(credentials: Credentials) -> bool:
+        """Refresh ahead of expiry; tokens stored without one get refreshed once."""
+        if not credentials.refresh_token:
+            return False
+        expiry = credentials.expiry
+        return expiry is None or expiry - datetime.utcnow() < REFRESH_SKEW
+
     def _get_credentials(self) -> Optional[Credentials]:
         """Get or refresh credentials."""
-        if self._credentials and self._credentials.valid:
+        # Same skew as the refresh below; google-auth's .valid would turn False
+        # minutes earlier and force a vault reload on every call in between
+        if self._credentials and self._credentials.token and not self._needs_refresh(self._credentials):
             return self._credentials
 
         tokens = self.vault.get("gmail_tokens")
         if not tokens:
             return None
 
-        self._credentials = Credentials(
-            token=tokens.get("access_token"),
-            refresh_token=tokens.get("refresh_token"),
-            token_uri=tokens.get("token_uri", "https://oauth2.googleapis.com/token"),
-            client_id=tokens.get("client_id"),
-            client_secret=tokens.get("client_secret"),
-            scopes=tokens.get("scopes", SCOPES)
-        )
+        self._credentials = self._credentials_from(tokens)
+        self._stored_token = self._credentials.token
+
+        expiry = self._credentials.expiry
+        if self._needs_refresh(self._credentials):
+            # Another worker may have refreshed since we loaded; reuse its tokens if so
+            tokens = self.vault.reload("gmail_tokens")
+            if tokens and tokens.get("expiry"):
+                stored = self._credentials_from(tokens)
+                if (expiry is None or stored.expiry > expiry) and \
+                        stored.expiry - datetime.utcnow() >= REFRESH_SKEW:
+                    self._credentials = stored
+                    self._stored_token = stored.token
+                    return self._credentials
 
-        # Refresh if expired
-        if self._credentials.expired and self._credentials.refresh_token:
             try:
                 from google.auth.transport.requests import Request
                 self._credentials.refresh(Request())
-
-                # Update stored tokens
-                self.vault.store("gmail_tokens", {
-                    "access_token": self._credentials.token,
-                    "refresh_token": self._credentials.refresh_token,
-                    "token_uri": self._credentials.token_uri,
-                    "client_id": self._credentials.client_id,
-                    "client_secret": self._credentials.client_secret,
-                    "scopes": list(self._credentials.scopes) if self._credentials.scopes else SCOPES
-                })
+                self._store_tokens(self._credentials)
             except Exception as e:
                 logger.error(f"Failed to refresh Gmail token: {e}")
                 return None
 
         return self._credentials
 
-    def _get_service(self):
-        """Get Gmail API service."""
-        if self._service:
-            return self._service
-
-        credentials = self._get_credentials()
+    async def _get_service(self):
+        """Get Gmail API service, rebuilt whenever the credentials object changes."""
+        # Checked on every call so refresh-ahead and sibling-token reuse keep
+        # working after the service is built
+        credentials = self._credentials
+        if not (credentials and credentials.token and not self._needs_refresh(credentials)):
+            # Loading may re-read the vault from disk and refresh over the network
+            credentials = await asyncio.get_running_loop().run_in_executor(
+                self._get_pool(), self._get_credentials
+            )
         if not credentials:
             return None
 
-        self._service = build('gmail', 'v1', credentials=credentials)
+        # Batch requests sign sub-requests with the service's own credentials,
+        # so a service built for a replaced object would send stale tokens
+        if self._service is not None and self._service_credentials is credentials:
+            return self._service
+
+        # The discovery document bundled with the library avoids a fetch per build
+        self._service = build(
+            'gmail', 'v1',
+            credentials=credentials,
+            static_discovery=True,
+            cache_discovery=False
+        )
+        self._service_credentials = credentials
         return self._service
 
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """Worker pool for blocking Google API and OAuth calls, created on first use."""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="eva-gmail")
+        return self._pool
+
+    def _thread_http(self):
+        """Authorized HTTP client for the current worker thread."""
+        http = getattr(self._thread_local, "http", None)
+        if http is None or http.credentials is not self._credentials:
+            import google_auth_httplib2
+            import httplib2
+
+            http = google_auth_httplib2.AuthorizedHttp(self._credentials, http=httplib2.Http())
+            self._thread_local.http = http
+        return http
+
+    async def _execute(self, request) -> Any:
+        """Run a request (or batch) off the event loop."""
+        result = await asyncio.get_running_loop().run_in_executor(
+            self._get_pool(), lambda: request.execute(http=self._thread_http())
+        )
+
+        # AuthorizedHttp may have refreshed the token itself; persist it so the
+        # new expiry is known here and other workers can reuse the token
+        credentials = self._credentials
+        if credentials is not None and credentials.token != self._stored_token:
+            self._store_tokens(credentials)
+        return result
+
     async def get_unread_emails(self, max_results: int = 10) -> List[Dict[str, Any]]:
         """Get unread emails from inbox."""
-        service = self._get_service()
+        service = await self._get_service()
         if not service:
             return []
 
         try:
-            results = service.users().messages().list(
+            results = await self._execute(service.users().messages().list(
                 userId='me',
                 q='is:unread',
                 maxResults=max_results
-            ).execute()
+            ))
 
             messages = results.get('messages', [])
-            emails = []
-
-            for msg in messages:
-                email_data = await self._get_email_details(msg['id'])
-                if email_data:
-                    emails.append(email_data)
-
-            return emails
+            return await self._get_emails_details(service, [msg['id'] for msg in messages])
 
         except HttpError as e:
             logger.error(f"Gmail API error: {e}")
             return []
 
+    @staticmethod
+    def _metadata_request(service, msg_id: str):
+        """messages.get request for the headers shown in email lists."""
+        return service.users().messages().get(
+            userId='me',
+            id=msg_id,
+            format='metadata',
+            metadataHeaders=['From', 'Subject', 'Date']
+        )
+
+    @staticmethod
+    def _parse_email_details(message: Dict[str, Any]) -> Dict[str, Any]:
+        """Pick the list fields out of a metadata-format message."""
+        # Only the three requested headers come back; stop once all are seen
+        sender = subject = date = None
+        for header in message.get('payload', {}).get('headers', ()):
+            name = header['name']
+            if name == 'From':
+                sender = header['value']
+            elif name == 'Subject':
+                subject = header['value']
+            elif name == 'Date':
+                date = header['value']
+            else:
+                continue
+            if sender is not None and subject is not None and date is not None:
+                break
+
+        return {
+            'id': message['id'],
+            'from': 'Unknown' if sender is None else sender,
+            'subject': 'No subject' if subject is None else subject,
+            'date': '' if date is None else date,
+            'snippet': message.get('snippet', ''),
+            'labels': message.get('labelIds', [])
+        }
+
     async def _get_email_details(self, msg_id: str) -> Optional[Dict[str, Any]]:
         """Get details of a specific email."""
-        service = self._get_service()
+        service = await self._get_service()
         if not service:
             return None
 
         try:
-            message = service.users().messages().get(
-                userId='me',
-                id=msg_id,
-                format='metadata',
-                metadataHeaders=['From', 'Subject', 'Date']
-            ).execute()
-
-            headers = {h['name']: h['value'] for h in message.get('payload', {}).get('headers', [])}
-
-            return {
-                'id': msg_id,
-                'from': headers.get('From', 'Unknown'),
-                'subject': headers.get('Subject', 'No subject'),
-                'date': headers.get('Date', ''),
-                'snippet': message.get('snippet', ''),
-                'labels': message.get('labelIds', [])
-            }
+            return self._parse_email_details(await self._execute(self._metadata_request(service, msg_id)))
 
         except HttpError as e:
             logger.error(f"Failed to get email {msg_id}: {e}")
             return None
 
+    async def _get_emails_details(self, service, msg_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get details of several emails, GMAIL_BATCH_LIMIT per batch request."""
+        details: Dict[str, Dict[str, Any]] = {}
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                logger.error(f"Failed to get email {request_id}: {exception}")
+            else:
+                details[request_id] = self._parse_email_details(response)
+
+        for start in range(0, len(msg_ids), GMAIL_BATCH_LIMIT):
+            batch = service.new_batch_http_request(callback=on_response)
+            for msg_id in msg_ids[start:start + GMAIL_BATCH_LIMIT]:
+                batch.add(self._metadata_request(service, msg_id), request_id=msg_id)
+            await self._execute(batch)
+
+        # Keep the order messages.list returned
+        return [details[msg_id] for msg_id in msg_ids if msg_id in details]
+
+    @staticmethod
+    def _decode_body(data: str) -> str:
+        """Decode a base64url message body part to text."""
+        return base64.urlsafe_b64decode(data).decode('utf-8')
+
     async def get_email_body(self, msg_id: str) -> str:
         """Get full email body."""
-        service = self._get_service()
+        service = await self._get_service()
         if not service:
             return ""
 
         try:
-            message = service.users().messages().get(
+            message = await self._execute(service.users().messages().get(
                 userId='me',
                 id=msg_id,
                 format='full'
-            ).execute()
+            ))
 
+            # Pick the part first so only the one we return gets decoded
             payload = message.get('payload', {})
-            body = ""
+            data = None
 
             if 'body' in payload and payload['body'].get('data'):
-                body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
+                data = payload['body']['data']
             elif 'parts' in payload:
                 for part in payload['parts']:
                     if part.get('mimeType') == 'text/plain' and part.get('body', {}).get('data'):
-                        body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
+                        data = part['body']['data']
                         break
 
-            return body
+            if data is None:
+                return ""
+
+            # Large bodies would stall the event loop while decoding
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._decode_body, data)
 
         except Exception as e:
             logger.error(f"Failed to get email body: {e}")
             return ""
 
+    @staticmethod
+    def _fast_build_raw(to: str, subject: str, body: str, html: bool) -> Optional[str]:
+        """
+        Build the base64url 'raw' message for a single-part email without
+        running the email package's generator. Every line ends in CRLF.
+
+        Returns None when the headers need the full MIME path (non-ASCII
+        recipient, or line breaks that must not end up in a header).
+        """
+        if not to.isascii() or any(c in to or c in subject for c in '\r\n'):
+            return None
+
+        if not subject.isascii():
+            # Long subjects fold into several encoded words; keep the folds CRLF too
+            subject = Header(subject, 'utf-8').encode(linesep='\r\n')
+
+        message = (
+            f"To: {to}\r\n"
+            f"Subject: {subject}\r\n"
+            "MIME-Version: 1.0\r\n"
+            f"Content-Type: text/{'html' if html else 'plain'}; charset=utf-8\r\n"
+            "Content-Transfer-Encoding: base64\r\n"
+            "\r\n"
+        ).encode('ascii') + base64.encodebytes(body.encode('utf-8')).replace(b'\n', b'\r\n')
+
+        return base64.urlsafe_b64encode(message).decode('ascii')
+
     async def send_email(self, to: str, subject: str, body: str, html: bool = False) -> bool:
         """Send an email."""
-        service = self._get_service()
+        service = await self._get_service()
         if not service:
             return False
 
         try:
-            message = MIMEMultipart('alternative')
-            message['To'] = to
-            message['Subject'] = subject
+            raw = self._fast_build_raw(to, subject, body, html)
+            if raw is None:
+                message = MIMEMultipart('alternative')
+                message['To'] = to
+                message['Subject'] = subject
 
-            if html:
-                message.attach(MIMEText(body, 'html'))
-            else:
-                message.attach(MIMEText(body, 'plain'))
+                if html:
+                    message.attach(MIMEText(body, 'html'))
+                else:
+                    message.attach(MIMEText(body, 'plain'))
 
-            raw = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
+                raw = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
 
-            service.users().messages().send(
+            await self._execute(service.users().messages().send(
                 userId='me',
                 body={'raw': raw}
-            ).execute()
+            ))
 
             logger.info(f"Email sent to {to}")
             return True
@@ -305,16 +471,16 @@ class GmailIntegration:
 
     async def mark_as_read(self, msg_id: str) -> bool:
         """Mark email as read."""
-        service = self._get_service()
+        service = await self._get_service()
         if not service:
             return False
 
         try:
-            service.users().messages().modify(
+            await self._execute(service.users().messages().modify(
                 userId='me',
                 id=msg_id,
                 body={'removeLabelIds': ['UNREAD']}
-            ).execute()
+            ))
             return True
         except HttpError as e:
             logger.error(f"Failed to mark email as read: {e}")
@@ -322,27 +488,20 @@ class GmailIntegration:
 
     async def get_important_emails(self, max_results: int = 5) -> List[Dict[str, Any]]:
         """Get important/priority emails."""
-        service = self._get_service()
+        service = await self._get_service()
         if not service:
             return []
 
         try:
             # Search for important or starred emails
-            results = service.users().messages().list(
+            results = await self._execute(service.users().messages().list(
                 userId='me',
                 q='is:important OR is:starred is:unread',
                 maxResults=max_results
-            ).execute()
+            ))
 
             messages = results.get('messages', [])
-            emails = []
-
-            for msg in messages:
-                email_data = await self._get_email_details(msg['id'])
-                if email_data:
-                    emails.append(email_data)
-
-            return emails
+            return await self._get_emails_details(service, [msg['id'] for msg in messages])
 
         except HttpError as e:
             logger.error(f"Gmail API error: {e}")
@@ -353,6 +512,7 @@ class GmailIntegration:
         self.vault.delete("gmail_oauth")
         self.vault.delete("gmail_tokens")
         self._service = None
+        self._service_credentials = None
         self._credentials = None
         logger.info("Gmail disconnected")
 
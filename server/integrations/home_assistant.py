@@ -1,8 +1,13 @@
 """Home Assistant integration for EVA."""
 
 import aiohttp
+import ahocorasick
+import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+import orjson
+import time
+from itertools import groupby
+from typing import Callable, Dict, Any, List, Optional, Tuple
 
 from .base import (
     BaseIntegration,
@@ -13,6 +18,22 @@ from .base import (
 
 logger = logging.getLogger("eva.integrations.hass")
 
+# How long GET responses are reused, in seconds
+LIST_DEVICES_TTL = 5
+STATE_TTL = 1
+
+# Seconds before retrying a dropped state WebSocket
+STATE_STREAM_RETRY = 5
+
+# Actions that accept {"entity_ids": [...]} and fan out concurrently
+BULK_ACTIONS = ("turn_on", "turn_off", "toggle")
+
+
+def _entity_domain(state: Dict[str, Any]) -> str:
+    """Domain part of a state's entity_id ("light.kitchen" -> "light")."""
+    domain, dot, _ = state.get("entity_id", "").partition(".")
+    return domain if dot else "unknown"
+
 
 class HomeAssistantIntegration(BaseIntegration):
     """
@@ -27,37 +48,45 @@ class HomeAssistantIntegration(BaseIntegration):
         self.url: str = ""
         self.token: str = ""
         self._session: Optional[aiohttp.ClientSession] = None
+        # url -> (fetched at, parsed JSON); cleared whenever a service call changes state
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        # entity_id -> state object, mirrored from the WebSocket API; only
+        # trusted while _states_live is set, otherwise reads go over REST
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._states_live = False
+        self._grouped_states: Optional[tuple] = None
+        self._ws_task: Optional[asyncio.Task] = None
 
         # Define capabilities
         self.capabilities = [
             IntegrationCapability(
                 name="turn_on",
                 description="Turn on a device",
-                parameters={"entity_id": "string"},
+                parameters={"entity_id": "string|list"},
                 example_phrases=["включи свет", "turn on", "включи", "врубай"]
             ),
             IntegrationCapability(
                 name="turn_off",
                 description="Turn off a device",
-                parameters={"entity_id": "string"},
+                parameters={"entity_id": "string|list"},
                 example_phrases=["выключи свет", "turn off", "выруби", "погаси"]
             ),
             IntegrationCapability(
                 name="toggle",
                 description="Toggle a device state",
-                parameters={"entity_id": "string"},
+                parameters={"entity_id": "string|list"},
                 example_phrases=["переключи", "toggle"]
             ),
             IntegrationCapability(
                 name="set_brightness",
                 description="Set light brightness",
-                parameters={"entity_id": "string", "brightness": "int"},
+                parameters={"entity_id": "string|list", "brightness": "int"},
                 example_phrases=["сделай ярче", "сделай темнее", "яркость"]
             ),
             IntegrationCapability(
                 name="set_temperature",
                 description="Set thermostat temperature",
-                parameters={"entity_id": "string", "temperature": "float"},
+                parameters={"entity_id": "string|list", "temperature": "float"},
                 example_phrases=["установи температуру", "сделай теплее", "охлади"]
             ),
             IntegrationCapability(
@@ -74,6 +103,23 @@ class HomeAssistantIntegration(BaseIntegration):
             )
         ]
 
+        # Phrase -> (capability index, capability name), matched in one pass per utterance
+        self._automaton = ahocorasick.Automaton()
+        for index, cap in enumerate(self.capabilities):
+            for phrase in cap._example_phrases_lc:
+                if phrase not in self._automaton:
+                    self._automaton.add_word(phrase, (index, cap.name))
+        self._automaton.make_automaton()
+
+    def match_intent(self, text: str) -> Optional[str]:
+        """Name of the capability whose example phrase occurs in text, if any.
+
+        Like matches_phrase, the earliest declared capability wins when
+        several phrases match.
+        """
+        hits = [value for _, value in self._automaton.iter(text.lower())]
+        return min(hits)[1] if hits else None
+
     async def connect(self, credentials: Dict[str, Any]) -> bool:
         """Connect to Home Assistant."""
         self.url = credentials.get("url", "").rstrip("/")
@@ -83,12 +129,19 @@ class HomeAssistantIntegration(BaseIntegration):
             logger.error("Missing url or token for Home Assistant")
             return False
 
-        # Create session
+        # Create session; pooled keep-alive sockets skip a TCP/TLS handshake per call
+        connector = aiohttp.TCPConnector(
+            limit=32,
+            limit_per_host=16,
+            keepalive_timeout=75,
+            ttl_dns_cache=300,
+            enable_cleanup_closed=True
+        )
         self._session = aiohttp.ClientSession(
-            headers={
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/json"
-            }
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=10, connect=3),
+            # POSTs send json=, which sets Content-Type; GETs have no body to describe
+            headers={"Authorization": f"Bearer {self.token}"}
         )
 
         # Test connection
@@ -97,6 +150,7 @@ class HomeAssistantIntegration(BaseIntegration):
                 if response.status == 200:
                     self.is_connected = True
                     logger.info(f"Connected to Home Assistant at {self.url}")
+                    self._start_state_stream()
                     return True
                 else:
                     logger.error(f"HA connection failed: {response.status}")
@@ -106,12 +160,89 @@ class HomeAssistantIntegration(BaseIntegration):
             logger.error(f"Failed to connect to Home Assistant: {e}")
             return False
 
+    def _start_state_stream(self):
+        """Start mirroring entity states over the WebSocket API."""
+        if self._ws_task and not self._ws_task.done():
+            return
+
+        self._ws_task = asyncio.create_task(self._state_stream_loop())
+
+    async def _state_stream_loop(self):
+        """Keep self._states in sync with HA, reconnecting if the socket drops."""
+        ws_url = self.url.replace("http", "ws", 1) + "/api/websocket"
+
+        while self.is_connected:
+            try:
+                async with self._session.ws_connect(ws_url, heartbeat=30) as ws:
+                    await self._ws_auth(ws)
+
+                    # Subscribe before the snapshot so no change falls in between
+                    await ws.send_json({"id": 1, "type": "subscribe_events", "event_type": "state_changed"})
+                    await ws.send_json({"id": 2, "type": "get_states"})
+
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        self._apply_ws_message(orjson.loads(msg.data))
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"HA state stream error: {e}")
+            finally:
+                self._states_live = False
+                self._states.clear()
+                self._grouped_states = None
+
+            if self.is_connected:
+                await asyncio.sleep(STATE_STREAM_RETRY)
+
+    async def _ws_auth(self, ws: aiohttp.ClientWebSocketResponse):
+        """Answer HA's auth_required greeting with the access token."""
+        msg = await ws.receive_json()
+        if msg.get("type") == "auth_required":
+            await ws.send_json({"type": "auth", "access_token": self.token})
+            msg = await ws.receive_json()
+        if msg.get("type") != "auth_ok":
+            raise ConnectionError(f"WebSocket auth failed: {msg.get('message', msg.get('type'))}")
+
+    def _apply_ws_message(self, msg: Dict[str, Any]):
+        """Fold a get_states result or state_changed event into self._states."""
+        if msg.get("type") == "event":
+            data = msg.get("event", {}).get("data", {})
+            entity_id = data.get("entity_id")
+            if not entity_id:
+                return
+            new_state = data.get("new_state")
+            if new_state is None:
+                self._states.pop(entity_id, None)
+            else:
+                self._states[entity_id] = new_state
+            self._grouped_states = None
+
+        elif msg.get("type") == "result" and msg.get("id") == 2:
+            if not msg.get("success"):
+                raise ConnectionError("get_states failed")
+            self._states = {state["entity_id"]: state for state in msg.get("result", [])}
+            self._grouped_states = None
+            self._states_live = True
+            logger.info(f"Mirroring {len(self._states)} HA entities over WebSocket")
+
     async def disconnect(self) -> None:
         """Disconnect from Home Assistant."""
+        self.is_connected = False
+        if self._ws_task:
+            self._ws_task.cancel()
+            try:
+                await self._ws_task
+            except asyncio.CancelledError:
+                pass
+            self._ws_task = None
+
         if self._session:
             await self._session.close()
             self._session = None
-        self.is_connected = False
+        self._cache.clear()
         logger.info("Disconnected from Home Assistant")
 
     async def execute(self, action: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
@@ -122,6 +253,12 @@ class HomeAssistantIntegration(BaseIntegration):
         params = params or {}
 
         try:
+            # "entity_ids" gets one request and one result per entity; a list
+            # in "entity_id" goes to HA as-is and runs as a single service call
+            if action in BULK_ACTIONS and "entity_ids" in params:
+                extra = {k: v for k, v in params.items() if k != "entity_ids"}
+                return await self.execute_bulk(action, params["entity_ids"], extra)
+
             if action == "turn_on":
                 return await self._call_service("homeassistant", "turn_on", params)
 
@@ -161,12 +298,51 @@ class HomeAssistantIntegration(BaseIntegration):
             logger.error(f"HA action failed: {e}")
             return {"success": False, "message": str(e)}
 
+    async def execute_bulk(
+        self,
+        action: str,
+        entity_ids: List[str],
+        extra: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run turn_on/turn_off/toggle on several entities concurrently.
+
+        Use this when each entity's outcome matters; otherwise passing the
+        list as entity_id to execute() costs a single POST.
+        """
+        if action not in BULK_ACTIONS:
+            return {"success": False, "message": f"Unsupported bulk action: {action}"}
+        if not self.is_connected or not self._session:
+            return {"success": False, "message": "Not connected to Home Assistant"}
+
+        extra = extra or {}
+        results = await asyncio.gather(
+            *(
+                self._call_service("homeassistant", action, {**extra, "entity_id": entity_id})
+                for entity_id in entity_ids
+            ),
+            return_exceptions=True
+        )
+
+        results = [
+            {"success": False, "message": str(result), "entity": entity_id}
+            if isinstance(result, Exception) else result
+            for entity_id, result in zip(entity_ids, results)
+        ]
+
+        return {
+            "success": all(r["success"] for r in results),
+            "message": f"Executed homeassistant.{action} on {len(results)} entities",
+            "results": results
+        }
+
     async def _call_service(self, domain: str, service: str, data: Dict) -> Dict:
         """Call a Home Assistant service."""
         url = f"{self.url}/api/services/{domain}/{service}"
 
         async with self._session.post(url, json=data) as response:
             if response.status in [200, 201]:
+                self._cache.clear()
                 return {
                     "success": True,
                     "message": f"Executed {domain}.{service}",
@@ -176,54 +352,95 @@ class HomeAssistantIntegration(BaseIntegration):
                 error = await response.text()
                 return {"success": False, "message": f"Error: {error}"}
 
-    async def _get_state(self, entity_id: str) -> Dict:
-        """Get state of an entity."""
-        url = f"{self.url}/api/states/{entity_id}"
+    async def _cached_get(
+        self,
+        url: str,
+        ttl: float,
+        transform: Optional[Callable[[Any], Any]] = None
+    ) -> Optional[Any]:
+        """GET url and parse JSON, reusing a response younger than ttl seconds.
+
+        transform, if given, is applied before caching so only its result is
+        kept. Returns None on a non-200 response; failures are not cached.
+        """
+        cached = self._cache.get(url)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
 
         async with self._session.get(url) as response:
-            if response.status == 200:
-                data = await response.json()
-                return {
-                    "success": True,
-                    "entity_id": entity_id,
-                    "state": data.get("state"),
-                    "attributes": data.get("attributes", {}),
-                    "friendly_name": data.get("attributes", {}).get("friendly_name", entity_id)
-                }
-            else:
-                return {"success": False, "message": f"Entity not found: {entity_id}"}
+            if response.status != 200:
+                return None
+            data = orjson.loads(await response.read())
 
-    async def _list_devices(self) -> Dict:
-        """List all devices/entities."""
-        url = f"{self.url}/api/states"
+        if transform is not None:
+            data = transform(data)
 
-        async with self._session.get(url) as response:
-            if response.status == 200:
-                states = await response.json()
+        self._cache[url] = (time.monotonic(), data)
+        return data
+
+    async def _get_state(self, entity_id: str) -> Dict:
+        """Get state of an entity."""
+        data = self._states.get(entity_id) if self._states_live else None
+        if data is None:
+            data = await self._cached_get(f"{self.url}/api/states/{entity_id}", STATE_TTL)
 
-                # Group by domain
-                devices = {}
-                for state in states:
-                    entity_id = state.get("entity_id", "")
-                    domain = entity_id.split(".")[0] if "." in entity_id else "unknown"
+        if data is None:
+            return {"success": False, "message": f"Entity not found: {entity_id}"}
 
-                    if domain not in devices:
-                        devices[domain] = []
+        return {
+            "success": True,
+            "entity_id": entity_id,
+            "state": data.get("state"),
+            "attributes": data.get("attributes", {}),
+            "friendly_name": data.get("attributes", {}).get("friendly_name", entity_id)
+        }
 
-                    devices[domain].append({
-                        "entity_id": entity_id,
-                        "state": state.get("state"),
-                        "name": state.get("attributes", {}).get("friendly_name", entity_id)
-                    })
+    @staticmethod
+    def _group_by_domain(states: List[Dict[str, Any]]) -> Tuple[int, Dict[str, Dict[str, list]]]:
+        """Reduce /api/states to (entity count, per-domain columns)."""
+        # Parallel columns rather than a dict per entity. HA usually returns
+        # entities of a domain together, so each run is added in one go; a
+        # domain that shows up again is appended to, keeping first-seen order.
+        devices = {}
+        for domain, run in groupby(states, key=_entity_domain):
+            run = list(run)
+            d = devices.get(domain)
+            if d is None:
+                d = devices[domain] = {"entity_ids": [], "states": [], "names": []}
+
+            entity_ids = [state.get("entity_id", "") for state in run]
+            d["entity_ids"] += entity_ids
+            d["states"] += [state.get("state") for state in run]
+            d["names"] += [
+                state.get("attributes", {}).get("friendly_name", entity_id)
+                for state, entity_id in zip(run, entity_ids)
+            ]
+
+        return len(states), devices
 
-                return {
-                    "success": True,
-                    "total": len(states),
-                    "domains": list(devices.keys()),
-                    "devices": devices
-                }
-            else:
-                return {"success": False, "message": "Failed to list devices"}
+    async def _list_devices(self) -> Dict:
+        """List all devices/entities."""
+        if self._states_live:
+            # Regrouped only after a state change arrives
+            if self._grouped_states is None:
+                self._grouped_states = self._group_by_domain(list(self._states.values()))
+            grouped = self._grouped_states
+        else:
+            # Cache the grouped columns, not the full state objects with their attributes
+            grouped = await self._cached_get(
+                f"{self.url}/api/states", LIST_DEVICES_TTL, transform=self._group_by_domain
+            )
+
+        if grouped is None:
+            return {"success": False, "message": "Failed to list devices"}
+
+        total, devices = grouped
+        return {
+            "success": True,
+            "total": total,
+            "domains": list(devices.keys()),
+            "devices": devices
+        }
 
     def get_status(self) -> Dict[str, Any]:
         """Get integration status."""
@@ -1,8 +1,8 @@
 """MQTT integration for EVA - connect to IoT devices."""
 
 import asyncio
-import json
 import logging
+import orjson
 from typing import Dict, Any, List, Optional, Callable
 from dataclasses import dataclass, field
 
@@ -22,6 +22,9 @@ except ImportError:
     MQTT_AVAILABLE = False
     logger.warning("aiomqtt not installed. MQTT integration disabled.")
 
+# Topic filters the listener always subscribes to
+DISCOVERY_TOPICS = ("homeassistant/#", "zigbee2mqtt/#", "tasmota/#")
+
 
 @dataclass
 class MQTTDevice:
@@ -54,7 +57,10 @@ class MQTTIntegration(BaseIntegration):
         self.password: str = ""
         self.topic_prefix: str = ""
 
+        # The listener's connection and the loop it runs on; publishes from
+        # that loop share it while it is up
         self._client: Optional[aiomqtt.Client] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
         self._devices: Dict[str, MQTTDevice] = {}
         self._subscriptions: Dict[str, Callable] = {}
         self._listener_task: Optional[asyncio.Task] = None
@@ -148,16 +154,20 @@ class MQTTIntegration(BaseIntegration):
                     username=self.username if self.username else None,
                     password=self.password if self.password else None
                 ) as client:
-                    # Subscribe to discovery topics
-                    await client.subscribe("homeassistant/#")
-                    await client.subscribe("zigbee2mqtt/#")
-                    await client.subscribe("tasmota/#")
-
-                    if self.topic_prefix:
-                        await client.subscribe(f"{self.topic_prefix}/#")
-
-                    async for message in client.messages:
-                        await self._handle_message(message)
+                    self._client = client
+                    self._client_loop = asyncio.get_running_loop()
+                    try:
+                        # Subscribe to discovery topics in a single SUBSCRIBE packet
+                        topics = [(topic, 0) for topic in DISCOVERY_TOPICS]
+                        if self.topic_prefix:
+                            topics.append((f"{self.topic_prefix}/#", 0))
+                        await client.subscribe(topics)
+
+                        async for message in client.messages:
+                            await self._handle_message(message)
+                    finally:
+                        self._client = None
+                        self._client_loop = None
 
             except asyncio.CancelledError:
                 break
@@ -168,16 +178,15 @@ class MQTTIntegration(BaseIntegration):
     async def _handle_message(self, message):
         """Handle incoming MQTT message."""
         topic = str(message.topic)
-        try:
-            payload = message.payload.decode()
-        except Exception:
-            payload = str(message.payload)
 
-        # Try to parse JSON
+        # Try to parse JSON; orjson reads the raw bytes without a decode first
         try:
-            data = json.loads(payload)
+            data = orjson.loads(message.payload)
         except Exception:
-            data = payload
+            try:
+                data = message.payload.decode()
+            except Exception:
+                data = str(message.payload)
 
         # Handle Home Assistant discovery
         if topic.startswith("homeassistant/") and "/config" in topic:
@@ -322,19 +331,36 @@ class MQTTIntegration(BaseIntegration):
             logger.error(f"MQTT action failed: {e}")
             return {"success": False, "message": str(e)}
 
+    def _listener_client(self) -> Optional["aiomqtt.Client"]:
+        """
+        The listener's live connection, if the caller is on the listener's loop.
+
+        Commands from the sync command path run on a separate loop; aiomqtt
+        clients are bound to the loop they were created on, so those callers
+        get None and open their own connection.
+        """
+        client = self._client
+        if client is None or asyncio.get_running_loop() is not self._client_loop:
+            return None
+        return client
+
     async def _publish(self, topic: str, payload: str) -> Dict[str, Any]:
         """Publish message to MQTT topic."""
         if not topic:
             return {"success": False, "message": "No topic specified"}
 
         try:
-            async with aiomqtt.Client(
-                hostname=self.host,
-                port=self.port,
-                username=self.username if self.username else None,
-                password=self.password if self.password else None
-            ) as client:
+            client = self._listener_client()
+            if client is not None:
                 await client.publish(topic, payload)
+            else:
+                async with aiomqtt.Client(
+                    hostname=self.host,
+                    port=self.port,
+                    username=self.username if self.username else None,
+                    password=self.password if self.password else None
+                ) as client:
+                    await client.publish(topic, payload)
 
             logger.info(f"Published to {topic}: {payload}")
             return {"success": True, "topic": topic, "payload": payload}
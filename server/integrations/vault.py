@@ -1,9 +1,9 @@
 """Secure credential vault for storing service credentials."""
 
 import os
-import json
 import base64
 import logging
+import orjson
 from typing import Optional, Dict, Any
 from datetime import datetime
 from cryptography.fernet import Fernet
@@ -70,13 +70,12 @@ class CredentialVault:
             encrypted_data = f.read()
 
         decrypted = self._fernet.decrypt(encrypted_data)
-        return json.loads(decrypted.decode())
+        return orjson.loads(decrypted)
 
     def _save_service(self, service: str, data: Dict[str, Any]):
         """Encrypt and save credentials for a service."""
         file_path = self._get_file_path(service)
-        json_data = json.dumps(data).encode()
-        encrypted = self._fernet.encrypt(json_data)
+        encrypted = self._fernet.encrypt(orjson.dumps(data))
 
         with open(file_path, 'wb') as f:
             f.write(encrypted)
@@ -107,6 +106,20 @@ class CredentialVault:
             return self._credentials[service].get("credentials")
         return None
 
+    def reload(self, service: str) -> Optional[Dict[str, str]]:
+        """Re-read a service from disk, picking up writes by other processes."""
+        try:
+            data = self._load_service(service)
+        except Exception as e:
+            logger.error(f"Failed to reload credentials for {service}: {e}")
+            return self.get(service)
+
+        if data:
+            self._credentials[service] = data
+        else:
+            self._credentials.pop(service, None)
+        return self.get(service)
+
     def get_with_metadata(self, service: str) -> Optional[Dict[str, Any]]:
         """Get credentials with metadata."""
         return self._credentials.get(service)
@@ -107,6 +107,14 @@ async def setup_scheduler():
         scheduler.add_notification_handler(notify_handler)
         scheduler.start()
 
+        # Sweep old TTS audio files hourly (sync jobs run in the scheduler's thread pool)
+        from core.tts import get_tts_service
+        scheduler.add_interval_job("tts_cleanup", get_tts_service().cleanup_old_files, hours=1)
+
+        # Drop delivered entries from the notification log daily
+        from core.notifications import get_notification_service
+        scheduler.add_interval_job("notifications_compact", get_notification_service().compact_pending, hours=24)
+
         # Setup default schedule for default user
         scheduler.setup_user_schedule("default")
 
@@ -173,7 +181,7 @@ async def lifespan(app: FastAPI):
         from core.llm import get_llm_service
 
         logger.info("Loading STT model (Whisper)...")
-        get_stt_service()
+        get_stt_service().warmup()
         logger.info("✓ STT ready")
 
         logger.info("Initializing TTS...")
@@ -197,6 +205,12 @@ async def lifespan(app: FastAPI):
     await setup_scheduler()
     await setup_integrations()
 
+    # Coalesce habit and notes file writes in the background
+    from core.habits import get_habit_tracker
+    from core.notes import get_notes_manager
+    get_habit_tracker().start()
+    get_notes_manager().start()
+
     logger.info("✨ EVA is ready!")
 
     yield
@@ -219,6 +233,27 @@ async def lifespan(app: FastAPI):
     except Exception:
         pass  # Scheduler might not have been initialized
 
+    # Flush pending habit writes
+    try:
+        from core.habits import get_habit_tracker
+        await get_habit_tracker().stop()
+    except Exception as e:
+        logger.error(f"Failed to flush habits: {e}")
+
+    # Close the notification HTTP session
+    try:
+        from core.notifications import get_notification_service
+        await get_notification_service().close()
+    except Exception:
+        pass  # Notification service might not have been initialized
+
+    # Flush pending notes and tasks writes
+    try:
+        from core.notes import get_notes_manager
+        await get_notes_manager().stop()
+    except Exception as e:
+        logger.error(f"Failed to flush notes: {e}")
+
 
 # Create FastAPI app
 app = FastAPI(
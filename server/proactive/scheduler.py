@@ -141,6 +141,19 @@ class ProactiveScheduler:
 
         logger.info(f"Added job {job_id}: {hour}:{minute} ({day_of_week})")
 
+    def add_interval_job(self, job_id: str, func: Callable, hours: float, args: list = None):
+        """Add a job that runs every `hours` hours (e.g. housekeeping)."""
+        self.scheduler.add_job(
+            func,
+            'interval',
+            hours=hours,
+            id=job_id,
+            args=args or [],
+            replace_existing=True
+        )
+
+        logger.info(f"Added job {job_id}: every {hours}h")
+
     def remove_job(self, job_id: str):
         """Remove a scheduled job."""
         try:
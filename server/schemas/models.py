@@ -38,6 +38,12 @@ class ChatMessageRequest(BaseModel):
     language: Language = Language.AUTO
 
 
+class TTSStreamRequest(BaseModel):
+    text: str
+    language: Language = Language.AUTO
+    emotion: Emotion = Emotion.FRIENDLY
+
+
 class CredentialRequest(BaseModel):
     service: str
     credentials: dict